@@ -0,0 +1,4 @@
+"""
+性能对比脚本，不是测试，也不随汉化流程跑:
+python -m benchmark.<脚本名> [参数]，用法见各脚本开头
+"""
@@ -0,0 +1,108 @@
+"""
+parse_text 里容易回溯爆炸的判断: 随机拼短片段找让原来的正则最慢的输入，再把它翻倍看耗时怎么涨，
+原来的正则和现在的线性版本一起跑，顺便比对判断结果
+python -m benchmark.backtracking [--candidates 个数] [--size 字符数] [--seed 种子]
+"""
+import argparse
+import math
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src import (
+    NormalLineClassifier,
+    PREDICATE_PATTERNS,
+    WIDGET_PRINT_MATCHER,
+    widget_set_to_pattern
+)
+from .predicates import PRINT_BEFORE, SET_TO_TEMPLATE_BEFORE
+
+"""拼输入用的片段: 几个字符集交界上的字符和各种结尾的半截"""
+ATOMS = [
+    "a", "1", " ", "(", ")", "[", "]", "{", "}", "\"", "'", "`", "$", "_", ".", ",", "?", "/", "+", ":", "-",
+    "<", ">", "<<", ">>", "to", " to ", "\"a", " a", ")>", "]>",
+]
+
+KEYS = NormalLineClassifier.SET_TO_KEYS
+SET_TO_LIST = PREDICATE_PATTERNS["widget_set_to_list"]
+
+"""名字 -> (开头, 原来的正则, 现在的判断)；widget_set_to_list 没改，放进来证明它本来就是线性的"""
+CASES: Dict[str, Tuple[str, Callable[[str], object], Callable[[str], object]]] = {
+    "widget_print": ("<<print ", re.compile(PRINT_BEFORE).search, WIDGET_PRINT_MATCHER.search),
+    "widget_set_to": (
+        "<<set $_strings ",
+        re.compile(SET_TO_TEMPLATE_BEFORE.format(keys="|".join(sorted(KEYS)))).search,
+        widget_set_to_pattern(KEYS).search
+    ),
+    "widget_set_to_list": ("<<set $a to [", SET_TO_LIST.search, SET_TO_LIST.search),
+}
+
+
+def seconds(predicate: Callable[[str], object], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predicate(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_unit(rng: random.Random, atoms: List[str]) -> str:
+    return "".join(rng.choice(atoms) for _ in range(rng.randint(1, 4)))
+
+
+def fuzz(prefix: str, reference, current, candidates: int, size: int, rng: random.Random) -> Tuple[str, int]:
+    """(让原来的正则最慢的重复单元, 判断结果对不上的输入数)"""
+    atoms = ATOMS + [prefix]
+    worst, worst_seconds, mismatches = "a", -1.0, 0
+    for _ in range(candidates):
+        unit = random_unit(rng, atoms)
+        repeated = prefix + unit * max(1, size // len(unit))
+        mixed = prefix + "".join(rng.choice(atoms) for _ in range(rng.randint(1, 40)))
+        for text in (repeated, mixed):
+            if bool(reference(text)) != bool(current(text)):
+                mismatches += 1
+                print(f"\tMISMATCH {text[:80]!r}")
+        elapsed = seconds(reference, repeated, 1)
+        if elapsed > worst_seconds:
+            worst, worst_seconds = unit, elapsed
+    return worst, mismatches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="找回溯爆炸的输入，比较原来的正则和线性版本")
+    parser.add_argument("--candidates", type=int, default=300)
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=2.0, help="原来的正则单次超过这么多秒就不再翻倍")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    print(f"{'case':<20}{'unit':<14}{'chars':>8}{'before s':>12}{'after s':>12}{'before k':>10}{'after k':>9}")
+    for name, (prefix, reference, current) in CASES.items():
+        unit, bad = fuzz(prefix, reference, current, args.candidates, args.size, rng)
+        mismatches += bad
+        previous = None
+        skip_reference = False
+        for times in (1, 2, 4, 8, 16):
+            text = prefix + unit * max(1, args.size * times // len(unit))
+            before = float("nan") if skip_reference else seconds(reference, text, args.repeat)
+            after = seconds(current, text, args.repeat)
+            skip_reference = skip_reference or before > args.budget
+            """k: 长度翻倍耗时涨 2^k 倍，1 左右是线性，2 / 3 是平方 / 立方"""
+            growth = [
+                f"{math.log2(now / then):.1f}" if previous and then > 0 and now == now else "-"
+                for now, then in zip((before, after), previous or (0.0, 0.0))
+            ]
+            print(f"{name:<20}{unit!r:<14}{len(text):>8}{before:>12.5f}{after:>12.5f}{growth[0]:>10}{growth[1]:>9}")
+            previous = (before, after)
+    print("same result" if not mismatches else f"MISMATCH: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
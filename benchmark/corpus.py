@@ -0,0 +1,173 @@
+"""
+不联网也能跑的合成语料，长得像 DoL 的 .twee / .js:
+段落头、叙述文本、<<link [[...|...]]>>、<<if>> 块、多行 <<script>> / <<run>> / 注释、
+JSON 样的 <<set ... to {>> / [ 块、<span> 和 widget
+python -m benchmark.corpus 输出目录 [--passages 段落数] [--seed 种子]
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+from typing import Callable, List
+
+WORDS = (
+    "you the a street school crowd look around feel warm cold bus park forest lake shop money "
+    "walk run hide smile blush quietly suddenly door window teacher friend stranger night morning"
+).split()
+NAMES = ["Robin", "Whitney", "Kylar", "Sydney", "Eden", "Avery", "Bailey", "Leighton"]
+PASSAGES = ["Street", "School Front", "Park", "Lake Shore", "Forest", "Orphanage", "Shopping Centre"]
+VARIABLES = ["$money", "$rng", "$phase", "$stress", "$trauma", "_npc", "$location", "$exposed"]
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+    return f"{' '.join(words).capitalize()}{rng.choice('.!?')}"
+
+
+def narrative(rng: random.Random) -> List[str]:
+    variants = [
+        lambda: sentence(rng),
+        lambda: f'"{sentence(rng)}" <<he>> says.',
+        lambda: f"{sentence(rng)} <<if {rng.choice(VARIABLES)} gte {rng.randint(1, 90)}>>{sentence(rng)}<</if>>",
+        lambda: f'<span class="{rng.choice(["red", "green", "blue", "pink"])}">{sentence(rng)}</span>',
+        lambda: f"{rng.choice(NAMES)} {sentence(rng).lower()} <<gstress>><<stress 6>>",
+        lambda: f"You have {rng.choice(VARIABLES)} left. {sentence(rng)}",
+    ]
+    return [rng.choice(variants)() for _ in range(rng.randint(1, 5))]
+
+
+def links(rng: random.Random) -> List[str]:
+    return [
+        f"<<link [[{sentence(rng)[:-1]}|{rng.choice(PASSAGES)}]]>><<set {rng.choice(VARIABLES)} to {rng.randint(0, 9)}>><</link>>"
+        for _ in range(rng.randint(1, 3))
+    ] + ["<br>"]
+
+
+def if_block(rng: random.Random) -> List[str]:
+    return [
+        f"<<if {rng.choice(VARIABLES)} is {rng.randint(0, 3)}>>",
+        *narrative(rng),
+        "<<elseif $rng gte 50>>",
+        *narrative(rng),
+        "<<else>>",
+        *narrative(rng),
+        "<</if>>",
+    ]
+
+
+def script_block(rng: random.Random) -> List[str]:
+    return [
+        "<<script>>",
+        f"\tlet count = V.{rng.choice(['money', 'stress', 'phase'])};",
+        "\tif (count > 10) {",
+        f"\t\tV.message = \"{sentence(rng)}\";",
+        "\t}",
+        "<</script>>",
+    ]
+
+
+def run_block(rng: random.Random) -> List[str]:
+    return [
+        "<<run (() => {",
+        f"\tT.text = \"{sentence(rng)}\";",
+        "\tT.count++;",
+        "})()>>",
+    ]
+
+
+def comment_block(rng: random.Random) -> List[str]:
+    start, end = rng.choice([("/*", "*/"), ("<!--", "-->")])
+    return [start, f"\t{sentence(rng)}", f"\tTODO: {sentence(rng)}", end]
+
+
+def json_set_block(rng: random.Random) -> List[str]:
+    if rng.random() < 0.5:
+        return [
+            f"<<set $clothes_{rng.randint(0, 99)} to {{",
+            f'\tname: "{rng.choice(WORDS)} {rng.choice(WORDS)}",',
+            f'\tdescription: "{sentence(rng)}",',
+            f"\tcost: {rng.randint(100, 9000)},",
+            f'\ttype: ["{rng.choice(WORDS)}"],',
+            "}>>",
+        ]
+    return [
+        "<<set _possibilities to [",
+        *(f'\t"{sentence(rng)}",' for _ in range(rng.randint(2, 5))),
+        "]>>",
+    ]
+
+
+def widget_block(rng: random.Random) -> List[str]:
+    return [
+        f'<<widget "{rng.choice(WORDS)}{rng.randint(0, 99)}">>',
+        *narrative(rng),
+        *if_block(rng),
+        "<</widget>>",
+    ]
+
+
+PIECES: List[Callable[[random.Random], List[str]]] = [
+    narrative, narrative, narrative, links, if_block, script_block, run_block, comment_block, json_set_block, widget_block
+]
+
+
+def twee_lines(passages: int, seed: int = 0) -> List[str]:
+    """passages 个段落，每行带换行符，和 readlines 一样"""
+    rng = random.Random(seed)
+    lines = []
+    for idx in range(passages):
+        tags = rng.choice(["", " [nobr]", " [widget]", " [exitCheckBypass]"])
+        lines.append(f":: {rng.choice(PASSAGES)} {idx}{tags}")
+        lines.append("<<effects>>")
+        for _ in range(rng.randint(2, 8)):
+            lines.extend(rng.choice(PIECES)(rng))
+        lines.append("")
+    return [f"{line}\n" for line in lines]
+
+
+def js_lines(functions: int, seed: int = 0) -> List[str]:
+    """functions 个函数，有 fragment.append、对象字面量和 UI 文本"""
+    rng = random.Random(seed)
+    lines = []
+    for idx in range(functions):
+        lines += [
+            f"function widget{idx}(slot) {{",
+            "\tconst fragment = document.createDocumentFragment();",
+            f"\tfragment.append(span(\"{sentence(rng)}\", \"{rng.choice(['red', 'green'])}\"));",
+            "\tfragment.append(",
+            f"\t\t\"{sentence(rng)}\"",
+            "\t);",
+            f"\tconst item = {{ name: \"{rng.choice(WORDS)}\", description: \"{sentence(rng)}\", cost: {rng.randint(1, 99)} }};",
+            f"\tif (V.{rng.choice(['money', 'stress'])} > {rng.randint(0, 9)}) return \"{sentence(rng)}\";",
+            "\treturn fragment;",
+            "}",
+            "",
+        ]
+    return [f"{line}\n" for line in lines]
+
+
+def write_corpus(out_dir: Path, passages: int = 2000, seed: int = 0, files: int = 20):
+    """写成 game/ 下的一堆文件，给要读目录的脚本用"""
+    per_file = max(1, passages // files)
+    for idx in range(files):
+        folder = out_dir / "game" / f"overworld-{idx % 4}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"synthetic-{idx}.twee").write_text("".join(twee_lines(per_file, seed + idx)), encoding="utf-8")
+    folder = out_dir / "game" / "03-JavaScript"
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "synthetic.js").write_text("".join(js_lines(per_file, seed)), encoding="utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="生成合成语料")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_corpus(args.out_dir, args.passages, args.seed)
+    print(f"已写入 {args.out_dir / 'game'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+跑一遍所有 .twee / .js 的提取，按规则表里的每一项统计耗时和决定了几行
+python -m benchmark.line_rules [游戏 game 目录] [--top 行数]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from src import (
+    LineRules,
+    ParseTextJS,
+    ParseTextTwee,
+    DIR_GAME_TEXTS_COMMON
+)
+from .predicates import FALLBACK_LINES
+
+
+def game_files(game_dir: Path):
+    """(文件, 所有行)，和 ProjectDOL._process_texts 一样按后缀选解析器"""
+    for file in sorted(game_dir.rglob("*")):
+        if file.suffix not in {".twee", ".js"}:
+            continue
+        with open(file, "r", encoding="utf-8") as fp:
+            yield file, fp.readlines()
+
+
+def parse_all(files) -> int:
+    total = 0
+    for file, lines in files:
+        parser = ParseTextTwee if file.suffix == ".twee" else ParseTextJS
+        total += len(parser(lines, file).parse())
+    return total
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="规则表逐项耗时")
+    parser.add_argument("game_dir", nargs="?", type=Path, default=DIR_GAME_TEXTS_COMMON)
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.game_dir.exists():
+        files = list(game_files(args.game_dir))
+    else:
+        print(f"{args.game_dir} 不存在，用内置的 {len(FALLBACK_LINES)} 行")
+        files = [(Path("game/benchmark.twee"), [f"{line}\n" for line in FALLBACK_LINES] * 20000)]
+
+    start = time.perf_counter()
+    lines = parse_all(files)
+    elapsed = time.perf_counter() - start
+    print(f"{len(files)} files, {lines} lines, {elapsed:.3f}s, {lines / elapsed:,.0f} lines/s")
+
+    LineRules.profiling = True
+    parse_all(files)
+    LineRules.profiling = False
+    print(f"{'rules':<24}{'item':<24}{'lines':>10}{'seconds':>10}")
+    for rules, item, count, seconds in LineRules.report()[:args.top]:
+        print(f"{rules:<24}{item:<24}{count:>10}{seconds:>10.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+parse_normal 的单行判断: 以前挨个跑 is_* vs NormalLineClassifier 一遍扫完，单位 行/秒
+python -m benchmark.parse_normal [游戏 game 目录] [--repeat 次数]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from src import (
+    NORMAL_LINE_CLASSIFIER,
+    NormalLineClassifier,
+    ParseTextTwee,
+    PREDICATE_PATTERNS,
+    DIR_GAME_TEXTS_COMMON
+)
+from .predicates import FALLBACK_LINES, game_lines
+
+
+def predicate_chain(line: str, maybe_json: bool = False) -> bool:
+    """原来 parse_normal 里的判断顺序"""
+    if ParseTextTwee.is_comment(line) or ParseTextTwee.is_event(line) or ParseTextTwee.is_only_marks(line):
+        return False
+    if "<" in line and (
+        ParseTextTwee.is_tag_span(line)
+        or ParseTextTwee.is_tag_label(line)
+        or ParseTextTwee.is_tag_input(line)
+        or ParseTextTwee.is_widget_note(line)
+        or ParseTextTwee.is_widget_print(line)
+        or ParseTextTwee.is_widget_option(line)
+        or (ParseTextTwee.is_widget_link(line) and not ParseTextTwee.is_widget_high_rate_link(line))
+        or ("<<set " in line and ParseTextTwee.is_widget_set_to(line, NormalLineClassifier.SET_TO_KEYS))
+        or PREDICATE_PATTERNS["widget_set_to_list"].search(line)
+    ):
+        return True
+    return not (("<" in line and ParseTextTwee.is_only_widgets(line)) or (maybe_json and ParseTextTwee.is_json_line(line)))
+
+
+def lines_per_second(classify, lines, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            classify(line, False)
+    return len(lines) * repeat / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="parse_normal 单行判断吞吐")
+    parser.add_argument("game_dir", nargs="?", type=Path, default=DIR_GAME_TEXTS_COMMON)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.game_dir.exists():
+        lines = game_lines(args.game_dir)
+        repeat = args.repeat
+    else:
+        print(f"{args.game_dir} 不存在，用内置的 {len(FALLBACK_LINES)} 行")
+        lines = FALLBACK_LINES
+        repeat = args.repeat * 20000
+    print(f"{len(lines)} lines x {repeat}")
+
+    mismatches = sum(
+        predicate_chain(line, maybe_json) != NORMAL_LINE_CLASSIFIER.is_text(line, maybe_json)
+        for line in lines
+        for maybe_json in (False, True)
+    )
+    before = lines_per_second(predicate_chain, lines, repeat)
+    after = lines_per_second(NORMAL_LINE_CLASSIFIER.is_text, lines, repeat)
+    print(f"predicate chain   {before:>12,.0f} lines/s")
+    print(f"fused classifier  {after:>12,.0f} lines/s  ({after / before:.1f}x)")
+
+    start = time.perf_counter()
+    total = 0
+    for _ in range(repeat):
+        total += len(ParseTextTwee([f"{line}\n" for line in lines], Path("game/benchmark.twee")).parse_normal())
+    print(f"parse_normal      {total / (time.perf_counter() - start):>12,.0f} lines/s (whole method)")
+
+    print("same result" if not mismatches else f"MISMATCH: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+ParseTextTwee / ParseTextJS 每个分派目标 (_parse_* 和 parse_normal) 单独计时，用 benchmark.corpus 的合成语料，不联网；
+结果存成 json，给 --compare 一个旧结果就并排打出快慢
+python -m benchmark.parsers [--passages 段落数] [--repeat 次数] [--output 结果.json] [--compare 旧结果.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple, Type, Union
+
+from src import (
+    DirNamesJS,
+    DirNamesTwee,
+    FileNamesJS,
+    FileNamesTwee,
+    ParseTextJS,
+    ParseTextTwee,
+    DIR_ROOT,
+    DIR_TEMP_ROOT
+)
+from .corpus import js_lines, twee_lines
+
+Parser = Type[Union[ParseTextTwee, ParseTextJS]]
+
+
+def is_target(name: str) -> bool:
+    return name.startswith("_parse_") or name == "parse_normal"
+
+
+def candidate_paths(parser: Parser):
+    """所有 文件夹 x 文件名 的组合，再加上 文件夹/子文件夹/文件名 和一个谁都不是的"""
+    if parser is ParseTextTwee:
+        dirs, files, suffix = [_.value for _ in DirNamesTwee], [_.value for _ in FileNamesTwee], ".twee"
+    else:
+        dirs, files, suffix = [_.value for _ in DirNamesJS], [_.value for _ in FileNamesJS], ".js"
+    for dir_ in dirs + ["overworld-town"]:
+        for file in files + [f"synthetic{suffix}"]:
+            yield Path("game") / dir_ / file
+            yield Path("game") / dir_ / "sub" / file
+
+
+def dispatch_table(parser: Parser) -> Dict[str, Path]:
+    """分派目标 -> 第一个走到它的路径: 临时包一层记下 parse 先进了哪个目标"""
+    entered: List[str] = []
+    originals = {name: func for name, func in vars(parser).items() if is_target(name) and callable(func)}
+
+    def wrap(name, func):
+        def wrapper(self, *args, **kwargs):
+            entered.append(name)
+            return func(self, *args, **kwargs)
+        return wrapper
+
+    table: Dict[str, Path] = {}
+    try:
+        for name, func in originals.items():
+            setattr(parser, name, wrap(name, func))
+        for path in candidate_paths(parser):
+            entered.clear()
+            parser(["x\n"], path).parse()
+            if entered and entered[0] not in table:
+                table[entered[0]] = path
+    finally:
+        for name, func in originals.items():
+            setattr(parser, name, func)
+    return table
+
+
+def time_target(parser: Parser, path: Path, lines: List[str], repeat: int, name: str = "parse") -> float:
+    """默认走 parse 的分派；分派走不到的目标直接调它自己"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        getattr(parser(lines, path), name)()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIR_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(passages: int, repeat: int, seed: int = 0) -> dict:
+    corpora: Dict[str, Tuple[Parser, List[str]]] = {
+        "twee": (ParseTextTwee, twee_lines(passages, seed)),
+        "js": (ParseTextJS, js_lines(passages, seed)),
+    }
+    results = {}
+    for kind, (parser, lines) in corpora.items():
+        table = dispatch_table(parser)
+        for name in sorted(name for name in vars(parser) if is_target(name)):
+            path = table.get(name)
+            if path is None:  # 哪个路径都分派不到 (没用上的方法)，直接调
+                seconds = time_target(parser, Path("game") / "overworld-town" / "synthetic", lines, repeat, name)
+            else:
+                seconds = time_target(parser, path, lines, repeat)
+            results[f"{kind}.{name}"] = {
+                "path": path.as_posix() if path else None,
+                "lines": len(lines),
+                "seconds": seconds,
+                "lines_per_s": len(lines) / seconds if seconds else 0.0,
+            }
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "passages": passages,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "targets": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="各分派目标耗时")
+    parser.add_argument("--passages", type=int, default=2000, help="合成语料的段落数 (js 是函数数)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=DIR_TEMP_ROOT / "benchmark_parsers.json")
+    parser.add_argument("--compare", type=Path, default=None, help="之前存的结果")
+    args = parser.parse_args()
+
+    result = run(args.passages, args.repeat, args.seed)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as fp:
+        json.dump(result, fp, ensure_ascii=False, indent=2)
+
+    old = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fp:
+            old = json.load(fp)["targets"]
+    print(f"{'target':<36}{'lines':>9}{'ms':>10}{'lines/s':>14}{'vs old':>9}")
+    for name, target in result["targets"].items():
+        ratio = f"{target['lines_per_s'] / old[name]['lines_per_s']:.2f}x" if old.get(name, {}).get("lines_per_s") else ""  # 比吞吐，语料大小不同也能比
+        direct = "" if target["path"] else "  (没有分派到，直接调)"
+        print(f"{name:<36}{target['lines']:>9}{target['seconds'] * 1000:>10.1f}{target['lines_per_s']:>14,.0f}{ratio:>9}{direct}")
+    print(f"结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
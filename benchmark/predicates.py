@@ -0,0 +1,112 @@
+"""
+ParseTextTwee.is_* 每行耗时: 以前每次 re.findall 原始字符串 vs 现在预编译 + search；is_only_widgets 是原来的逐个删 vs 按下标扫一遍
+python -m benchmark.predicates [游戏 game 目录] [--repeat 次数]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from src import (
+    ParseTextTwee,
+    PREDICATE_PATTERNS,
+    DIR_GAME_TEXTS_COMMON
+)
+
+"""没下载游戏时用的几行"""
+FALLBACK_LINES = [
+    '<<set _text_output to "You feel better.">>',
+    '<span class="green">You feel better.</span>',
+    '<<link [[Next|Street Event]]>><<set $phase to 1>><</link>>',
+    '<<print either("a", "b")>>',
+    '<<if $rng gte 50>>You look around.<</if>>',
+    '<label>Name</label> <<textbox "$name" "">>',
+    '<input type="text" value="x">',
+    '<<note "Bound" "red">>',
+    '<<option "Yes" true>>',
+    '"Hello," <<he>> says.',
+    'name: "rope",',
+    '<<set $money -= 500>><<gggtrauma>>',
+    '<<effects>>',
+    '/* comment */',
+]
+
+"""以前会回溯爆炸的两个正则，现在是 WIDGET_PRINT_MATCHER 和 WIDGET_SET_TO_TEMPLATE"""
+PRINT_BEFORE = r"<<print\s[^<]*[\"\'`\w]+[\?\s\w\.\$,\'\"<>\[\]\(\)/]+(?:\)>>|\">>|\'>>|`>>|\]>>)"
+SET_TO_TEMPLATE_BEFORE = r"<<set\s(?:{keys})[\'\"\w\s\[\]\$\+\.\(\)\{{\}}:\-]*(?:to|\+|\+=|\().*?[\w\{{\"\'`]+(?:\w| \w|<<|\"\w)"
+
+SET_TO_KEYS = {r"\$_strings", r"\$_text_output", "_text_output", r"\$_customertype", r"\$_theboy", "_clothesDesc"}
+
+BEFORE = {
+    "is_json_line": lambda line: any(re.findall(PREDICATE_PATTERNS["json_line"].pattern, line)),
+    "is_only_marks": lambda line: not any(re.findall(r"([A-Za-z\d]+)", line)),
+    "is_tag_span": lambda line: any(re.findall(PREDICATE_PATTERNS["tag_span"].pattern, line)),
+    "is_tag_label": lambda line: any(re.findall(r"<label>\w", line)) or any(re.findall(r"\w</label>", line)),
+    "is_tag_input": lambda line: any(re.findall(PREDICATE_PATTERNS["tag_input"].pattern, line)),
+    "is_widget_note": lambda line: any(re.findall(PREDICATE_PATTERNS["widget_note"].pattern, line)),
+    "is_widget_print": lambda line: any(re.findall(PRINT_BEFORE, line)),
+    "is_widget_if": lambda line: any(re.findall(PREDICATE_PATTERNS["widget_if"].pattern, line)),
+    "is_widget_option": lambda line: any(re.findall(PREDICATE_PATTERNS["widget_option"].pattern, line)),
+    "is_widget_link": lambda line: any(re.findall(r"<<link\s*(\[\[|\"\w)", line)),
+    "is_widget_set_to": lambda line: any(re.findall(
+        re.compile(SET_TO_TEMPLATE_BEFORE.format(keys="|".join(SET_TO_KEYS))), line
+    )),
+    "is_only_widgets": lambda line: (
+        ("<" in line or "$" in line or line.startswith("_")) and ParseTextTwee._only_widgets_slow(line)
+    ),
+}
+
+AFTER = {
+    name: getattr(ParseTextTwee, name)
+    for name in BEFORE
+    if name != "is_widget_set_to"
+}
+AFTER["is_widget_set_to"] = lambda line: ParseTextTwee.is_widget_set_to(line, SET_TO_KEYS)
+
+
+def game_lines(game_dir: Path):
+    lines = []
+    for file in sorted(game_dir.rglob("*.twee")):
+        with open(file, "r", encoding="utf-8") as fp:
+            lines.extend(line.strip() for line in fp if line.strip())
+    return lines
+
+
+def per_line_ns(predicate, lines, repeat: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        for line in lines:
+            predicate(line)
+    return (time.perf_counter_ns() - start) / (len(lines) * repeat)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="is_* 判断的每行耗时")
+    parser.add_argument("game_dir", nargs="?", type=Path, default=DIR_GAME_TEXTS_COMMON)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.game_dir.exists():
+        lines = game_lines(args.game_dir)
+        repeat = args.repeat
+    else:
+        print(f"{args.game_dir} 不存在，用内置的 {len(FALLBACK_LINES)} 行")
+        lines = FALLBACK_LINES
+        repeat = args.repeat * 20000
+    print(f"{len(lines)} lines x {repeat}")
+
+    mismatches = 0
+    print(f"{'predicate':<20}{'before ns':>12}{'after ns':>12}{'speedup':>10}")
+    for name, before in BEFORE.items():
+        after = AFTER[name]
+        mismatches += sum(bool(before(line)) != bool(after(line)) for line in lines)
+        before_ns = per_line_ns(before, lines, repeat)
+        after_ns = per_line_ns(after, lines, repeat)
+        print(f"{name:<20}{before_ns:>12.0f}{after_ns:>12.0f}{before_ns / after_ns:>9.1f}x")
+    print("same result" if not mismatches else f"MISMATCH: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+整个游戏的 token 流两种存法的峰值内存 (RSS)，每种单独起一个子进程量:
+source: 只读源码，作为基准
+tokens: Tokenizer.tokenize()，每个 token 一个 Token 对象加一份切出来的字符串
+table: Tokenizer.table()，三列 array 共用源码
+python -m benchmark.token_memory [游戏 game 目录] [--times 倍数]
+"""
+import argparse
+import importlib.util
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src import DIR_GAME_TEXTS_COMMON
+from src.ast import Tokenizer
+from .predicates import FALLBACK_LINES
+from .tokenizer import game_sources
+
+FORMS = ("source", "tokens", "table")
+
+
+def peak_rss_mb() -> float:
+    """没有 resource (Windows) 时退回 tracemalloc，只算 python 分配的"""
+    try:
+        import resource
+    except ImportError:
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10  # Linux 上是 KB
+
+
+def load_sources(game_dir: Path, times: int):
+    if game_dir.exists():
+        sources = list(game_sources(game_dir))
+    else:
+        sources = ["\n".join(FALLBACK_LINES * 2000)]
+    return sources * times
+
+
+def child(form: str, game_dir: Path, times: int):
+    """子进程里: 建好一种存法并一直拿着，打印一行 json"""
+    if importlib.util.find_spec("resource") is None:
+        import tracemalloc
+        tracemalloc.start()
+    sources = load_sources(game_dir, times)
+    start = time.perf_counter()
+    if form == "tokens":
+        streams = [Tokenizer(source).tokenize() for source in sources]
+    elif form == "table":
+        streams = [Tokenizer(source).table() for source in sources]
+    else:
+        streams = []
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "form": form,
+        "tokens": sum(len(stream) for stream in streams),
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="token 流的峰值内存")
+    parser.add_argument("game_dir", nargs="?", type=Path, default=DIR_GAME_TEXTS_COMMON)
+    parser.add_argument("--times", type=int, default=1, help="源码复制几份")
+    parser.add_argument("--child", choices=FORMS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.game_dir, args.times)
+        return 0
+
+    if not args.game_dir.exists():
+        print(f"{args.game_dir} 不存在，用内置的 {len(FALLBACK_LINES)} 行")
+    results = {}
+    for form in FORMS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmark.token_memory", str(args.game_dir), "--times", str(args.times), "--child", form],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[form] = json.loads(output.splitlines()[-1])
+
+    baseline = results["source"]["peak_rss_mb"]
+    print(f"{'form':<10}{'tokens':>12}{'seconds':>10}{'peak MB':>10}{'+MB':>10}{'B/token':>10}")
+    for form, result in results.items():
+        extra = result["peak_rss_mb"] - baseline
+        per_token = extra * 2 ** 20 / result["tokens"] if result["tokens"] else 0
+        print(f"{form:<10}{result['tokens']:>12}{result['seconds']:>10.3f}{result['peak_rss_mb']:>10.1f}{extra:>10.1f}{per_token:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
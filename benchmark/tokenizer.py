@@ -0,0 +1,63 @@
+"""
+src.ast.Tokenizer 扫一遍游戏里所有 .twee，再把同一份输入翻 1/2/4/8 倍看是不是线性
+python -m benchmark.tokenizer [游戏 game 目录] [--repeat 次数]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from src import DIR_GAME_TEXTS_COMMON
+from src.ast import Tokenizer
+from .predicates import FALLBACK_LINES
+
+"""没结尾的宏 / 注释，原来每个都要试到文件末尾"""
+UNCLOSED = ["<<set $a to", "/* comment", "<!-- comment", "<span class="]
+
+"""一行里一堆没有 > 的 <x，原来每个标签都要试到行尾；翻倍时整行一起变长"""
+UNCLOSED_TAGS = "<a" * 10000
+
+
+def game_sources(game_dir: Path):
+    for file in sorted(game_dir.rglob("*.twee")):
+        with open(file, "r", encoding="utf-8") as fp:
+            yield fp.read()
+
+
+def tokenize_all(sources, repeat: int = 1):
+    """(token 数, 最快一次的秒数)"""
+    best, tokens = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = sum(sum(1 for _ in Tokenizer(source).iter_tokens()) for source in sources)
+        best = min(best, time.perf_counter() - start)
+    return tokens, best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tokenizer 吞吐和线性检查")
+    parser.add_argument("game_dir", nargs="?", type=Path, default=DIR_GAME_TEXTS_COMMON)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.game_dir.exists():
+        sources = list(game_sources(args.game_dir))
+    else:
+        print(f"{args.game_dir} 不存在，用内置的 {len(FALLBACK_LINES)} 行")
+        sources = ["\n".join(FALLBACK_LINES * 2000)]
+    size = sum(len(source) for source in sources)
+    tokens, elapsed = tokenize_all(sources, args.repeat)
+    print(f"{len(sources)} files, {size / 1e6:.2f}M chars, {tokens} tokens, {elapsed:.3f}s, {size / 1e6 / elapsed:.2f}M chars/s, {tokens / elapsed:,.0f} tokens/s")
+
+    sample = "\n".join(sources)[:200_000]
+    print(f"{'input':<16}{'times':>6}{'chars':>12}{'seconds':>10}{'ns/char':>10}")
+    for name, unit in (("game", sample), ("unclosed", "\n".join(UNCLOSED * 5000)), ("unclosed_tags", UNCLOSED_TAGS)):
+        for times in (1, 2, 4, 8):
+            source = unit * times
+            _, elapsed = tokenize_all([source], args.repeat)
+            print(f"{name:<16}{times:>6}{len(source):>12}{elapsed:>10.3f}{elapsed / len(source) * 1e9:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+单独检查汉化包，不用下载游戏:
+python -m lint [汉化包 csv 目录] [--report 报告.json/.csv] [--workers 进程数]
+有问题时退出码为 1
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from src import (
+    Linter,
+    DIR_PARATRANZ,
+    DIR_TEMP_ROOT
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="检查汉化包里的翻译")
+    parser.add_argument("csv_dir", nargs="?", type=Path, default=DIR_PARATRANZ / "utf8")
+    parser.add_argument("--report", type=Path, default=DIR_TEMP_ROOT / "lint_report.json")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    return 1 if Linter.lint(args.csv_dir, args.report, args.workers) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -61,14 +61,16 @@ async def main():
         logger.error("未填写 PARATRANZ_TOKEN, 汉化包下载可能失败，请前往 https://paratranz.cn/users/my 的设置栏中查看自己的 token, 并在 src/consts.py 中填写\n")
         return
 
-    """ 删库跑路 """
-    await dol.drop_all_dirs()
+    """ 删库跑路 游戏目录留着，压缩包没变时只恢复覆写过的文件 """
+    await dol.drop_all_dirs(keep_game=True)
 
     """ 获取最新版本 """
     await dol.fetch_latest_version()
 
     """ 提取键值 """
-    await dol.download_from_gitgud()
+    download_flag = await dol.download_from_gitgud()
+    if not download_flag:
+        return
     await dol.create_dicts()
 
     """ 更新导出的字典 成品在 `raw_dicts` 文件夹里 """
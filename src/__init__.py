@@ -1,6 +1,8 @@
 from .consts import *
 from .log import *
 
+from .line_rules import *
+from .lint import *
 from .paratranz import *
 from .parse_text import *
 from .project_dol import *
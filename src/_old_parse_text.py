@@ -5,7 +5,7 @@ import re
 # TODO
 REGEX_PATTERNS = {
     "macro": r"""<<(/)?([A-Za-z][\w-]*|[=-])(?:\s*)((?:(?:/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)|(?://.*\n)|(?:`(?:\\.|[^`\\\n])*?`)|(?:"(?:\\.|[^"\\\n])*?")|(?:'(?:\\.|[^'\\\n])*?')|(?:\[(?:[<>]?[Ii][Mm][Gg])?\[[^\r\n]*?\]\]+)|[^>]|(?:>(?!>)))*?)(/)?>>""",
-    "tag": r"""(?<!\<)<(?:/)?[a-zA-Z]+.*?>(?:[\s\S]*?)""",
+    "tag": r"""(?<!\<)<(?:/)?[a-zA-Z][^>\n]*>""",
     "variable": r"""(?:(\$|_)(?:[A-Za-z_\$][A-Za-z0-9_\$]*))((?:\.[A-Za-z_\$][A-Za-z0-9_\$]*)*)\b""",
     "comment": r""""""
 }
@@ -1,35 +1,69 @@
 import re
-from dataclasses import dataclass
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from pprint import pprint
 from re import Pattern
-from typing import Union, Any
-from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from loguru import logger
 
+from .._old_parse_text import REGEX_PATTERNS
 
-class Patterns(Enum):
-    SPACE: str = " "
-    RETURN: str = "\n"
-    NUMBERS: str = "0123456789"
 
-    STORY_START: str = ":"  # :: STORY
+"""
+一个总正则按顺序试: 段落头 > 注释 > 宏 > 标签 > 变量 > 换行 > 文本
+宏 / 标签 / 变量沿用 _old_parse_text.REGEX_PATTERNS，变量前面不能紧挨着字母数字 (不把 snake_case 拆开)
+"""
+TOKEN_PATTERNS = {
+    "passage": r"^::[^\n]*",
+    "comment": r"/\*[\s\S]*?\*/|<!--[\s\S]*?-->",
+    "macro": REGEX_PATTERNS["macro"],
+    "tag": REGEX_PATTERNS["tag"],
+    "variable": r"(?<![A-Za-z0-9])" + REGEX_PATTERNS["variable"],
+    "newline": r"\n",
+    "text": r"[^<$_\n/]+|[\s\S]",
+}
 
-    VAR_NAME_HEAD: str = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"
-    VAR_NAME_BODY: str = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_0123456789"
 
-    WIDGET_START: str = "<"
-    TAG_START: str = "<"
-    TAG_SLASH: str = "/"
+@lru_cache(maxsize=None)
+def master_pattern(macro: bool = True, block_comment: bool = True, html_comment: bool = True, tag: bool = True) -> Pattern:
+    """
+    宏 / 注释没有结尾时会一路试到文件末尾才失败，每个 << 都这样就成了平方；
+    它们只在后面根本没有 >> / */ / --> 时才会失败，所以扫过最后一个结尾之后换成不带它们的总正则
+    标签同理，只是按行: 这一行后面没有 > 了，剩下的部分就不带标签
+    """
+    comments = [
+        pattern
+        for pattern, enabled in zip(TOKEN_PATTERNS["comment"].split("|"), (block_comment, html_comment))
+        if enabled
+    ]
+    patterns = dict(TOKEN_PATTERNS, comment="|".join(comments))
+    if not comments:
+        del patterns["comment"]
+    if not macro:
+        del patterns["macro"]
+    if not tag:
+        del patterns["tag"]
+    return re.compile(
+        "|".join(f"(?P<{type_}>{pattern})" for type_, pattern in patterns.items()),
+        re.MULTILINE
+    )
 
-    WIDGET_END: str = ">"
-    TAG_END: str = ">"
+
+MASTER_PATTERN: Pattern = master_pattern()
+MACRO_NAME = re.compile(r"<</?([A-Za-z][\w-]*|[=-])")
+TAG_NAME = re.compile(r"</?([a-zA-Z]+)")
 
 
 @dataclass
 class Token:
     type: str
     value: Any
+    start: int = 0  # 在源码里的位置，value 就是 source[start:end]
+    end: int = 0
+    name: Optional[str] = None  # 段落名 / 宏名 / 标签名
 
     def __repr__(self):
         return self.__str__()
@@ -39,106 +73,312 @@ class Token:
 
 
 class Tokenizer:
-    """词法分析器"""
+    """词法分析器，用一个总正则从头扫到尾，线性时间"""
     def __init__(self, raw_code: Union[str, bytes]):
-        self._raw_code = raw_code
+        self._raw_code = raw_code.decode("utf-8") if isinstance(raw_code, bytes) else raw_code
+
+    def iter_spans(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        边扫边吐 (类型, start, end)，不切字符串；相邻的首尾相接，连着的文本合成一个
+        iter_tokens 和 TokenTable 都从这里来
+        """
+        source = self._raw_code
+        ends = (source.rfind(">>"), source.rfind("*/"), source.rfind("-->"))  # 过了就不可能再有宏 / 注释
+        pattern, flags, ends_at = MASTER_PATTERN, (True, True, True), max(ends)
+        line_end = line_gt = -1  # 最近查过的一行: 行尾换行符的位置、最后一个 > 的位置
+        no_tag_until = -1  # 到这一行行尾都不可能再有标签
+        switch_at = ends_at
+        text_start = text_end = None
+        pos, length = 0, len(source)
+        while pos < length:
+            if pos >= switch_at:
+                if pos >= ends_at:
+                    flags = tuple(pos < end for end in ends)
+                    ends_at = min((end for end in ends if pos < end), default=length)
+                tag = pos > no_tag_until
+                pattern = master_pattern(*flags, tag)
+                switch_at = ends_at if tag else min(ends_at, no_tag_until + 1)
+            match = pattern.match(source, pos)
+            type_, start, end = match.lastgroup, pos, match.end()
+            pos = end
+            if type_ == "text":
+                if end == start + 1 and source[start] == "<" and start > no_tag_until:
+                    # < 没配成标签: 这一行后面没有 > 了就先关掉标签，每行最多查一次
+                    if start > line_end:
+                        line_end = source.find("\n", start)
+                        line_end = length if line_end < 0 else line_end
+                        line_gt = source.rfind(">", start, line_end)
+                    if start >= line_gt:
+                        no_tag_until, switch_at = line_end, pos
+                if text_start is None:
+                    text_start = start
+                text_end = end
+                continue
+            if text_start is not None:
+                yield "text", text_start, text_end
+                text_start = None
 
-        self._tokens: list = []
+            if type_ == "macro" and source.startswith("<</", start):
+                type_ = "macro_close"
+            elif type_ == "tag" and source.startswith("</", start):
+                type_ = "tag_close"
+            yield type_, start, end
+        if text_start is not None:
+            yield "text", text_start, text_end
 
-    def tokenize(self):
+    def iter_tokens(self) -> Iterator[Token]:
+        """边扫边吐，不建列表；拼起来就是源码"""
+        source = self._raw_code
+        for type_, start, end in self.iter_spans():
+            yield make_token(source, type_, start, end)
+
+    def tokenize(self) -> List[Token]:
         """str->tokens"""
-        index: int = 0
-        while index < self._raw_code.__len__():
-            current_char = self._raw_code[index]
-
-            # 空格
-            if current_char == Patterns.SPACE.value:
-                index += 1
-            # 换行
-            elif current_char == Patterns.RETURN.value:
-                index += 1
-            # 数字
-            elif current_char in Patterns.NUMBERS.value:
-                value = ""
-                while current_char in Patterns.NUMBERS.value:
-                    value += current_char
-                    index += 1
-                    current_char = self._raw_code[index]
-                self._tokens.append(Token(type="number", value=value))
-            # 故事(:: Story)
-            elif current_char == Patterns.STORY_START.value:
-                if (index == 0 or self._raw_code[index-1] == Patterns.RETURN.value) and self._raw_code[index+1] == Patterns.STORY_START.value:
-                    value = ""
-                    if self._raw_code[index+2] == Patterns.SPACE.value:
-                        index += 3
-                        current_char = self._raw_code[index]
-                    while current_char != Patterns.RETURN.value:
-                        value += current_char
-                        index += 1
-                        current_char = self._raw_code[index]
-                    self._tokens.append(Token(type="story", value=value))
-            elif current_char == Patterns.TAG_START.value:
-                # 1. <tag>
-                if self._raw_code[index+1] == Patterns.VAR_NAME_HEAD.value:
-                    value = ""
-                    index += 1
-                    current_char = self._raw_code[index]
-                    while current_char != Patterns.TAG_END.value:
-                        value += current_char
-                        index += 1
-                        current_char =self._raw_code[index]
-                    self._tokens.append(Token(type="tag", value=value))
-                # 2. </tag>
-                elif self._raw_code[index+1] == Patterns.TAG_SLASH.value:
-                    value = ""
-                    index += 2
-                    current_char = self._raw_code[index]
-                    while current_char not in {Patterns.TAG_END.value, Patterns.SPACE.value}:
-                        value += current_char
-                        index += 1
-                        current_char =self._raw_code[index]
-                    self._tokens.append(Token(type="tag_close", value=value))
-                # 3. <<widget>>
-                elif self._raw_code[index+1] == Patterns.WIDGET_START.value:
-                    value = ""
-                    type_ = "widget"
-                    index += 2
-                    current_char = self._raw_code[index]
-                    # 4. <</widget>>
-                    if current_char == Patterns.TAG_SLASH.value:
-                        type_ = "widget_close"
-                        index += 1
-                        current_char = self._raw_code[index]
-                    while current_char not in {Patterns.TAG_END.value, Patterns.SPACE.value}:
-                        value += current_char
-                        index += 1
-                        current_char =self._raw_code[index]
-                    self._tokens.append(Token(type=type_, value=value))
-                # 3. 小于号
-                # 4. <-!--
-                else:
-                    index += 1
-                    continue
-            else:
-                index += 1
-                continue
-        return self._tokens
+        return list(self.iter_tokens())
+
+    def table(self) -> "TokenTable":
+        """str->紧凑的 token 表"""
+        table = TokenTable(self._raw_code)
+        for type_, start, end in self.iter_spans():
+            table.append(type_, start, end)
+        return table
+
+
+def make_token(source: str, type_: str, start: int, end: int) -> Token:
+    """切出值，段落 / 宏 / 标签顺便取名字"""
+    value = source[start:end]
+    name = None
+    if type_ == "passage":
+        name = value[2:].strip()
+    elif type_ in {"macro", "macro_close"}:
+        name = MACRO_NAME.match(value).group(1)
+    elif type_ in {"tag", "tag_close"}:
+        name = TAG_NAME.match(value).group(1)
+    return Token(type=type_, value=value, start=start, end=end, name=name)
+
+
+"""TokenTable 里的类型编号"""
+TOKEN_TYPES = ("passage", "comment", "macro", "macro_close", "tag", "tag_close", "variable", "newline", "text")
+TOKEN_TYPE_IDS = {type_: idx for idx, type_ in enumerate(TOKEN_TYPES)}
+
+
+class TokenTable:
+    """
+    整个 token 流存成三列 array: 类型编号 / start / end，共用一份源码，
+    值和名字要用时才切出来；一个 token 17 字节，Token 对象连同切出来的字符串要几百字节
+    """
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def append(self, type_: str, start: int, end: int):
+        self.types.append(TOKEN_TYPE_IDS[type_])
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, idx: int) -> Token:
+        return make_token(self.source, TOKEN_TYPES[self.types[idx]], self.starts[idx], self.ends[idx])
+
+    def __iter__(self) -> Iterator[Token]:
+        source = self.source
+        for type_id, start, end in zip(self.types, self.starts, self.ends):
+            yield make_token(source, TOKEN_TYPES[type_id], start, end)
+
+    def type(self, idx: int) -> str:
+        return TOKEN_TYPES[self.types[idx]]
+
+    def value(self, idx: int) -> str:
+        return self.source[self.starts[idx]:self.ends[idx]]
+
+    def nbytes(self) -> int:
+        """三列占的字节数，不算源码"""
+        return sum(column.itemsize * len(column) for column in (self.types, self.starts, self.ends))
+
+
+"""有 <</名字>> 收尾的宏 / 有 </名字> 收尾的标签才有子节点；这些标签本身就没有结尾"""
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"})
+"""里面是代码不是给玩家看的字"""
+SKIP_MACROS = frozenset({"script"})
+SKIP_TAGS = frozenset({"script", "style"})
+"""段落头: ::名字 [标签] {元数据}"""
+PASSAGE_HEADER = re.compile(r"::\s*((?:\\.|[^\\\[{])*?)\s*(?:\[([^\]]*)\])?\s*(?:\{.*\})?\s*$")
+LETTER = re.compile(r"[^\W\d_]")
+
+
+@dataclass
+class Node:
+    """
+    语法树节点，start / end 是在源码里的位置:
+    document > passage > macro / tag (可以嵌套) > text / variable / comment / newline
+    容器宏 / 标签的 end 是收尾那个 token 的 end，close 是收尾的 token
+    """
+    type: str
+    start: int
+    end: int
+    name: Optional[str] = None
+    value: Optional[str] = None
+    children: List["Node"] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)  # 段落标签
+    close: Optional[Token] = None
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f"({self.type} {self.name or ''}) [{self.start}:{self.end}] {len(self.children)} children"
 
 
 class Parser:
-    """语法分析器"""
+    """
+    语法分析器: tokens -> 段落 > 宏 / 标签 / 文本 的树，一趟扫完，宏和标签按名字配对；
+    宏 / 标签先都当容器压栈 (<<set>> 这种没有收尾)，配对时把中间没收尾的一次性摊平，每个节点最多挪一次
+    """
+    def __init__(self, raw_code: Union[str, bytes]):
+        self._tokenizer = Tokenizer(raw_code)
+        self.source = self._tokenizer._raw_code
+        self._stack: List[Node] = []  # 还没收尾的容器，最底下是当前段落
+        self._opened: Dict[Tuple[str, str], int] = defaultdict(int)  # 栈里各 (类型, 名字) 有几个
+
+    def parse(self) -> Node:
+        document = Node(type="document", start=0, end=len(self.source))
+        for token in self._tokenizer.iter_tokens():
+            if token.type == "passage":
+                self._close_passage(token.start)
+                self._stack = [self._passage(token)]
+                document.children.append(self._stack[0])
+                continue
+            if not self._stack:  # 第一个段落头之前的内容
+                self._stack = [Node(type="passage", start=0, end=0, name="")]
+                document.children.append(self._stack[0])
+
+            if token.type in {"macro_close", "tag_close"}:
+                self._close(token)
+                continue
+            node = Node(type=token.type, start=token.start, end=token.end, name=token.name, value=token.value)
+            self._stack[-1].children.append(node)
+            if self._is_container(token):
+                self._stack.append(node)
+                self._opened[self._key(node.type, node.name)] += 1
+        self._close_passage(len(self.source))
+        return document
+
+    @staticmethod
+    def _key(type_: str, name: str) -> Tuple[str, str]:
+        """标签名不分大小写"""
+        return (type_, name.lower()) if type_ == "tag" else (type_, name)
+
+    @staticmethod
+    def _passage(token: Token) -> Node:
+        match = PASSAGE_HEADER.match(token.value)
+        name, tags = (match.group(1), (match.group(2) or "").split()) if match else (token.name, [])
+        return Node(type="passage", start=token.start, end=token.end, name=name, value=token.value, tags=tags)
+
+    @staticmethod
+    def _is_container(token: Token) -> bool:
+        if token.type == "macro":
+            return not token.value.endswith("/>>")
+        if token.type == "tag":
+            return token.name.lower() not in VOID_TAGS and not token.value.endswith("/>")
+        return False
+
+    def _close(self, token: Token):
+        """从栈顶往下找同名的开头，中间没收尾的摊平；栈里没有同名的就当普通节点"""
+        key = self._key("macro" if token.type == "macro_close" else "tag", token.name)
+        if not self._opened[key]:
+            self._stack[-1].children.append(
+                Node(type=token.type, start=token.start, end=token.end, name=token.name, value=token.value)
+            )
+            return
+        depth = len(self._stack) - 1
+        while self._key(self._stack[depth].type, self._stack[depth].name) != key:
+            depth -= 1
+        self._flatten(depth + 1)
+        node = self._stack.pop()
+        self._opened[key] -= 1
+        node.close, node.end = token, token.end
+
+    def _flatten(self, depth: int):
+        """
+        stack[depth:] 都没收尾: 每个都是上一个的最后一个子节点，
+        所以它们的子节点按顺序接到 stack[depth - 1] 后面，它们自己变成叶子
+        """
+        parent = self._stack[depth - 1]
+        for node in self._stack[depth:]:
+            parent.children.extend(node.children)
+            node.children = []
+            self._opened[self._key(node.type, node.name)] -= 1
+        del self._stack[depth:]
+
+    def _close_passage(self, end: int):
+        if not self._stack:
+            return
+        self._flatten(1)
+        self._stack[0].end = end
 
 
 class Traverserer:
-    """遍历器"""
+    """遍历器: 先序走整棵树 (不递归)，或者只拿要翻译的文本"""
+    def __init__(self, document: Node, source: str):
+        self.document = document
+        self.source = source
+
+    def walk(self, node: Optional[Node] = None, skip: Optional[Callable[[Node], bool]] = None) -> Iterator[Node]:
+        """先序；skip 命中的节点自己会吐出来，但不往下走"""
+        stack = [self.document if node is None else node]
+        while stack:
+            node = stack.pop()
+            yield node
+            if skip is None or not skip(node):
+                stack.extend(reversed(node.children))
+
+    @staticmethod
+    def is_code(node: Node) -> bool:
+        """<<script>> / <script> / <style> 里面是代码"""
+        if node.type == "macro":
+            return node.name in SKIP_MACROS
+        if node.type == "tag":
+            return node.name.lower() in SKIP_TAGS
+        return False
+
+    def iter_texts(self) -> Iterator[Node]:
+        """
+        要翻译的文本节点: 不在代码里，有字母；去掉首尾空白，
+        start / end 是精确位置，source[start:end] == value
+        """
+        for node in self.walk(skip=self.is_code):
+            if node.type != "text" or not LETTER.search(node.value):
+                continue
+            value = node.value.strip()
+            start = node.start + node.value.index(value[0])
+            yield Node(type="text", start=start, end=start + len(value), value=value)
+
+
+def parse(raw: Union[str, bytes]) -> Node:
+    return Parser(raw).parse()
 
 
-def parse(raw: str):
-    return Tokenizer(raw).tokenize()
+__all__ = [
+    "TOKEN_PATTERNS",
+    "master_pattern",
+    "Token",
+    "Tokenizer",
+    "make_token",
+    "TOKEN_TYPES",
+    "TokenTable",
+    "Node",
+    "Parser",
+    "Traverserer",
+    "parse"
+]
 
 
 if __name__ == '__main__':
     with open(Path(r"D:\GitHub\vrelnir_localization\degrees-of-lewdity-master\game\00-framework-tools\02-version\waiting-room.twee"), "r", encoding="utf-8") as fp:
         code = fp.read()
     result = parse(code)
-    pprint(result)
+    pprint([(node.start, node.end, node.value) for node in Traverserer(result, code).iter_texts()])
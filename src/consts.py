@@ -33,9 +33,20 @@ DIR_FINE_DICTS = DIR_ROOT / "fine_dicts"
 
 DIR_PARATRANZ = DIR_ROOT / "paratranz"
 
+DIR_CACHE_ROOT = DIR_ROOT / "cache"  # 删库跑路也不删
+DIR_APPLY_CACHE = DIR_CACHE_ROOT / "apply"
+DIR_PASSAGE_CACHE = DIR_CACHE_ROOT / "passages"
+DIR_EXTRACT_CACHE = DIR_CACHE_ROOT / "extract"
+DIR_REPOSITORY_CACHE = DIR_CACHE_ROOT / "repository"
+
 """文件"""
-FILE_REPOSITORY_ZIP = DIR_TEMP_ROOT / "dol.zip"
+FILE_REPOSITORY_ZIP = DIR_REPOSITORY_CACHE / "dol.zip"
+FILE_REPOSITORY_META = DIR_REPOSITORY_CACHE / "dol.json"  # 压缩包的地址和 ETag / Last-Modified / Content-Length
+FILE_REPOSITORY_MARKER_NAME = ".repository.json"  # 放在解压出来的游戏目录里，记着是哪个压缩包解出来的
 FILE_PARATRANZ_ZIP = DIR_TEMP_ROOT / "paratranz_export.zip"
+FILE_APPLY_MANIFEST_NAME = "manifest.json"  # 放在 DIR_APPLY_CACHE / type_ 里，正式版和开发版各一份
+FILE_PASSAGE_CACHE = DIR_PASSAGE_CACHE / "passages.json"
+FILE_EXTRACT_CACHE = DIR_EXTRACT_CACHE / "extract.sqlite3"
 
 SUFFIX_TWEE = ".twee"
 SUFFIX_JS = ".js"
@@ -176,6 +187,16 @@ HIGH_RATE_LINKS = {
 }
 
 
+"""覆写规则改了就加一，让增量覆写的缓存失效 (SOURCE_FIXUPS、HIGH_RATE_LINKS 和覆写用的那几个方法的源码已经自动算进去了，见 ProjectDOL._apply_rules_hash；只有别处的改动影响成品时才要加)"""
+APPLY_RULES_VERSION = 1
+
+"""提取规则改了就加一，让段落缓存和整文件缓存失效 (parse_text / line_rules 的源码和相关常量已经自动算进去了，见 parser_code_version)"""
+PARSE_RULES_VERSION = 1
+
+"""整文件提取缓存最多占多大，超了先删最久没用的"""
+EXTRACT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
 __all__ = [
     "PARATRANZ_BASE_URL",
     "PARATRANZ_HEADERS",
@@ -199,9 +220,19 @@ __all__ = [
     "DIR_RAW_DICTS",
     "DIR_FINE_DICTS",
     "DIR_PARATRANZ",
+    "DIR_CACHE_ROOT",
+    "DIR_APPLY_CACHE",
+    "DIR_PASSAGE_CACHE",
+    "DIR_EXTRACT_CACHE",
+    "DIR_REPOSITORY_CACHE",
 
     "FILE_REPOSITORY_ZIP",
+    "FILE_REPOSITORY_META",
+    "FILE_REPOSITORY_MARKER_NAME",
     "FILE_PARATRANZ_ZIP",
+    "FILE_APPLY_MANIFEST_NAME",
+    "FILE_PASSAGE_CACHE",
+    "FILE_EXTRACT_CACHE",
 
     "SUFFIX_TWEE",
     "SUFFIX_JS",
@@ -211,5 +242,8 @@ __all__ = [
     "DirNamesJS",
     "FileNamesJS",
 
-    "HIGH_RATE_LINKS"
+    "HIGH_RATE_LINKS",
+    "APPLY_RULES_VERSION",
+    "PARSE_RULES_VERSION",
+    "EXTRACT_CACHE_MAX_BYTES"
 ]
@@ -0,0 +1,111 @@
+"""
+整文件提取缓存: (文件内容 sha256, 选规则的依据, 提取代码版本) -> 有效行的行号，
+存在 sqlite 里，超过 EXTRACT_CACHE_MAX_BYTES 先删最久没用的；
+子进程只读，新条目和命中的条目交给主进程一次写回
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from . import line_rules, parse_text
+from .consts import *
+from .log import logger
+
+
+@lru_cache(maxsize=None)
+def parser_code_version() -> str:
+    """
+    提取结果依赖的所有东西一起算 hash，整文件缓存和段落缓存的 key 都带上它，改了不用手动清缓存:
+    PARSE_RULES_VERSION、parse_text / line_rules 的源码、高频选项和选规则用的目录名 / 文件名
+    """
+    digest = hashlib.sha256(str(PARSE_RULES_VERSION).encode("utf-8"))
+    for module in (parse_text, line_rules):
+        digest.update(Path(module.__file__).read_bytes())
+    inputs = [
+        HIGH_RATE_LINKS,
+        *([(member.name, member.value) for member in names] for names in (DirNamesTwee, FileNamesTwee, DirNamesJS, FileNamesJS)),
+    ]
+    digest.update(json.dumps(inputs, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ExtractCache:
+    """整文件提取缓存，一个 sqlite 文件，表里是 key / 行号 / 大小 / 最近使用时间"""
+
+    def __init__(self, db_file: Path = FILE_EXTRACT_CACHE, max_bytes: int = EXTRACT_CACHE_MAX_BYTES):
+        self._db_file = db_file
+        self._max_bytes = max_bytes
+        os.makedirs(db_file.parent, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=60)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extract (key TEXT PRIMARY KEY, lines BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def file_key(lines: List[str], filepath: Path) -> str:
+        """ParseTextTwee / ParseTextJS 只按上级文件夹、文件夹、文件名选规则"""
+        digest = hashlib.sha256("".join(lines).encode("utf-8")).hexdigest()
+        dispatch_key = "/".join((filepath.parent.parent.name, filepath.parent.name, filepath.name))
+        return f"{digest}:{dispatch_key}:{parser_code_version()}"
+
+    @staticmethod
+    def encode(able_lines: List[bool]) -> bytes:
+        return array("I", (idx for idx, able in enumerate(able_lines) if able)).tobytes()
+
+    @staticmethod
+    def decode(data: bytes, line_count: int) -> List[bool]:
+        able_lines = [False] * line_count
+        indexes = array("I")
+        indexes.frombytes(data)
+        for idx in indexes:
+            able_lines[idx] = True
+        return able_lines
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn.execute("SELECT lines FROM extract WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def update(self, entries: Dict[str, bytes], hits: Iterable[str]):
+        """写入新条目，命中的刷新使用时间，最后按大小淘汰"""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO extract (key, lines, size, used) VALUES (?, ?, ?, ?)",
+                ((key, data, len(key) + len(data), now) for key, data in entries.items())
+            )
+            self._conn.executemany("UPDATE extract SET used = ? WHERE key = ?", ((now, key) for key in hits))
+        self.evict()
+
+    def evict(self) -> int:
+        """超过大小时从最久没用的删起，返回删了几条"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extract").fetchone()[0]
+        if total <= self._max_bytes:
+            return 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM extract ORDER BY used"):
+            if total <= self._max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        with self._conn:
+            self._conn.executemany("DELETE FROM extract WHERE key = ?", stale)
+        self._conn.execute("VACUUM")
+        logger.info(f"\t- 整文件提取缓存超过 {self._max_bytes / 1024 / 1024:.1f}MB, 删掉最久没用的 {len(stale)} 条")
+        return len(stale)
+
+
+__all__ = [
+    "parser_code_version",
+    "ExtractCache"
+]
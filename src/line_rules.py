@@ -0,0 +1,241 @@
+"""
+parse_text 里 _parse_* 共用的逐行状态机:
+每个文件的规则写成一张表，按顺序放 Block (跨行的一段，带状态) 和 Rule (单行判断)，
+每行只 strip 一次，从上往下第一个能决定这一行的项给出结果，都决定不了就是 default
+"""
+import time
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+"""判断一行 (已经 strip 过)"""
+Predicate = Callable[[str], bool]
+
+
+@dataclass(frozen=True)
+class Block:
+    """
+    跨行的一段，检查顺序和原来手写的 flag 一样:
+    enter 命中 -> 进入，这一行给 enter_result
+    在段里 (exit_anywhere 时不用在段里) 且 exit 命中 -> 退出，这一行给 exit_result
+    在段里 -> inside 不是 None 就给 inside，是 None 就交给后面的项
+    track 为 True 时只记状态，不决定结果 (maybe_json 这种)
+    """
+    name: str
+    enter: Predicate
+    exit: Predicate
+    inside: Optional[bool] = False
+    enter_result: bool = False
+    exit_result: bool = False
+    exit_anywhere: bool = False
+    track: bool = False
+
+
+@dataclass(frozen=True)
+class Rule:
+    """单行判断: state 为空或正在 state 这一段里，且 when 为空或命中 -> result"""
+    name: str
+    when: Optional[Predicate] = None
+    result: Union[bool, Predicate] = True
+    state: Optional[str] = None
+
+
+"""编译后的一项: (行, 各段状态) -> 结果，None 是决定不了"""
+Step = Callable[[str, List[bool]], Optional[bool]]
+"""各段是否在段里，按 Block 出现的顺序"""
+States = Tuple[bool, ...]
+
+
+class LineRules:
+    """一张规则表，建的时候编译成一个扫描函数 (profiling 时换成一项一个闭包)，每行从头试到第一个有结果的"""
+    profiling: bool = False
+    """(表名, 项名) -> [决定了几行, 花了几秒]"""
+    profile: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+
+    def __init__(self, name: str, items: Sequence[Union[Block, Rule]], default: bool = False):
+        self.name = name
+        self.items = tuple(items)
+        self.default = default
+        self._states = {
+            item.name: idx
+            for idx, item in enumerate(_ for _ in self.items if isinstance(_, Block))
+        }
+        self._steps: List[Step] = [self._compile(item) for item in self.items]
+        self._scan = self._compile_scanner()
+
+    def _compile(self, item: Union[Block, Rule]) -> Step:
+        if isinstance(item, Rule):
+            return self._compile_rule(item)
+        return self._compile_block(item)
+
+    def _compile_rule(self, rule: Rule) -> Step:
+        when, result = rule.when, rule.result
+        state = None if rule.state is None else self._states[rule.state]
+        decide = (lambda line: result) if isinstance(result, bool) else (lambda line: bool(result(line)))
+
+        if state is None and when is None:
+            return lambda line, active: decide(line)
+        if state is None:
+            return lambda line, active: decide(line) if when(line) else None
+        if when is None:
+            return lambda line, active: decide(line) if active[state] else None
+        return lambda line, active: decide(line) if active[state] and when(line) else None
+
+    def _compile_block(self, block: Block) -> Step:
+        idx = self._states[block.name]
+        enter, exit_ = block.enter, block.exit
+        enter_result, exit_result, inside = block.enter_result, block.exit_result, block.inside
+        if block.track:
+            enter_result = exit_result = inside = None
+        exit_anywhere = block.exit_anywhere
+
+        def step(line: str, active: List[bool]) -> Optional[bool]:
+            if enter(line):
+                active[idx] = True
+                return enter_result
+            if (exit_anywhere or active[idx]) and exit_(line):
+                active[idx] = False
+                return exit_result
+            if active[idx]:
+                return inside
+            return None
+        return step
+
+    def _compile_scanner(self) -> Callable[[Sequence[str], States], Tuple[List[bool], States]]:
+        """
+        整张表拼成一个函数的源码再 exec: 状态是局部变量，判断函数是默认参数 (也是局部变量)，
+        省掉 _steps 里每项一次的函数调用；结果和 _steps 一条条跑完全一样
+        """
+        names: Dict[str, object] = {"default": self.default}
+        body = []
+        for idx, item in enumerate(self.items):
+            if isinstance(item, Block):
+                state = f"state_{self._states[item.name]}"
+                names[f"enter_{idx}"], names[f"exit_{idx}"] = item.enter, item.exit
+                exit_check = f"exit_{idx}(line)" if item.exit_anywhere else f"{state} and exit_{idx}(line)"
+                if item.track:
+                    body += [
+                        f"if enter_{idx}(line):",
+                        f"    {state} = True",
+                        f"elif {exit_check}:",
+                        f"    {state} = False",
+                    ]
+                    continue
+                body += [
+                    f"if enter_{idx}(line):",
+                    f"    {state} = True",
+                    f"    append({item.enter_result})",
+                    "    continue",
+                    f"if {exit_check}:",
+                    f"    {state} = False",
+                    f"    append({item.exit_result})",
+                    "    continue",
+                ]
+                if item.inside is not None:
+                    body += [
+                        f"if {state}:",
+                        f"    append({item.inside})",
+                        "    continue",
+                    ]
+                continue
+
+            conditions = []
+            if item.state is not None:
+                conditions.append(f"state_{self._states[item.state]}")
+            if item.when is not None:
+                names[f"when_{idx}"] = item.when
+                conditions.append(f"when_{idx}(line)")
+            if isinstance(item.result, bool):
+                result = str(item.result)
+            else:
+                names[f"result_{idx}"] = item.result
+                result = f"bool(result_{idx}(line))"
+            if not conditions:
+                body += [f"append({result})", "continue"]
+                break  # 后面的永远走不到
+            body += [
+                f"if {' and '.join(conditions)}:",
+                f"    append({result})",
+                "    continue",
+            ]
+        else:
+            body.append("append(default)")
+
+        states = [f"state_{idx}" for idx in range(len(self._states))]
+        source = "\n".join([
+            f"def scan(lines, states, {', '.join(f'{name}={name}' for name in names)}):",
+            *([f"    {', '.join(states)}, = states"] if states else []),
+            "    results = []",
+            "    append = results.append",
+            "    for line in lines:",
+            "        line = line.strip()",
+            "        if not line:",
+            "            append(False)",
+            "            continue",
+            *(f"        {line}" for line in body),
+            f"    return results, ({''.join(f'{state}, ' for state in states)})",
+        ])
+        namespace = dict(names)
+        exec(compile(source, f"<LineRules {self.name}>", "exec"), namespace)
+        return namespace["scan"]
+
+    @property
+    def initial_states(self) -> States:
+        return (False,) * len(self._states)
+
+    def run(self, lines: Sequence[str]) -> List[bool]:
+        """每行一个结果，空行一定是 False"""
+        return self.run_from(lines)[0]
+
+    def run_from(self, lines: Sequence[str], states: Optional[States] = None) -> Tuple[List[bool], States]:
+        """
+        从给定的各段状态接着跑，连最后的状态一起返回；
+        一个文件切成几块依次接着跑，结果和整个文件一起跑一样
+        """
+        states = self.initial_states if states is None else tuple(states)
+        if self.profiling:
+            return self._run_profiled(lines, states)
+        return self._scan(lines, states)
+
+    def _run_profiled(self, lines: Sequence[str], states: States) -> Tuple[List[bool], States]:
+        """和 run_from 一样，顺便记每一项的耗时和决定了几行"""
+        names = [item.name for item in self.items]
+        stats = [self.profile[(self.name, name)] for name in names]
+        default_stats = self.profile[(self.name, "default")]
+        active = list(states)
+        results = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                results.append(False)
+                continue
+            for step, stat in zip(self._steps, stats):
+                start = time.perf_counter()
+                result = step(line, active)
+                stat[1] += time.perf_counter() - start
+                if result is not None:
+                    stat[0] += 1
+                    results.append(result)
+                    break
+            else:
+                default_stats[0] += 1
+                results.append(self.default)
+        return results, tuple(active)
+
+    @classmethod
+    def report(cls) -> List[Tuple[str, str, int, float]]:
+        """(表名, 项名, 决定了几行, 秒)，按耗时从多到少"""
+        return sorted(
+            ((rules, item, int(lines), seconds) for (rules, item), (lines, seconds) in cls.profile.items()),
+            key=lambda row: row[3],
+            reverse=True
+        )
+
+
+__all__ = [
+    "Block",
+    "Rule",
+    "States",
+    "LineRules"
+]
@@ -0,0 +1,185 @@
+import csv
+import json
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import quote
+
+from .consts import *
+from .log import logger
+from .parse_text import ParseTextTwee
+
+
+SINGLE_ANGLE = re.compile(r"(?<![<>=])[<>](?![<>=])")  # 单个 < 或 >，不吃前后字符，a<b>c 两个都算
+LINK_EVENT = re.compile(r"<<link\s\[\[.*?\|(.*?)\]\]")
+LINK_TARGET = re.compile(r"(?<!<<link )\[\[([^\]]*?)\]\]")  # <<link [[ ]]>> 归 is_different_event 管
+PLACEHOLDER = re.compile(r"(?<![\w$])[$_][A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*")  # $VAR / _var 以及后面的 .PROP
+
+
+def is_full_comma(line_zh: str, line_en: str = "") -> bool:
+    """全角逗号"""
+    return line_zh.endswith('"，')
+
+
+def is_lack_angle(line_zh: str, line_en: str) -> bool:
+    """<<> 缺一个 >"""
+    if ("<" not in line_en and ">" not in line_en) or ParseTextTwee.is_only_marks(line_en):
+        return False
+
+    if "<<" not in line_en and ">>" not in line_en:
+        angles_zh = SINGLE_ANGLE.findall(line_zh)
+        left_angle_single_zh = angles_zh.count("<")
+        right_angle_single_zh = angles_zh.count(">")
+        if left_angle_single_zh == right_angle_single_zh:
+            return False
+        angles_en = SINGLE_ANGLE.findall(line_en)
+        return (
+            angles_en.count("<") != left_angle_single_zh
+            or angles_en.count(">") != right_angle_single_zh
+        )  # 形如 < > <, 也只有这一种情况
+
+    left_angle_double_zh = line_zh.count("<<")
+    right_angle_double_zh = line_zh.count(">>")
+    if left_angle_double_zh == right_angle_double_zh:
+        return False
+    return (
+        line_en.count("<<") != left_angle_double_zh
+        or line_en.count(">>") != right_angle_double_zh
+    )  # 形如 << >> <<
+
+
+def is_different_event(line_zh: str, line_en: str) -> bool:
+    """<<link [[TEXT|EVENT]]>> 中 EVENT 打错了"""
+    if "<<link [[" not in line_en or "|" not in line_en or not line_zh:
+        return False
+    event_en = LINK_EVENT.findall(line_en)
+    if not event_en:
+        return False
+    return event_en != LINK_EVENT.findall(line_zh)
+
+
+def _link_targets(line: str) -> List[str]:
+    """[[TEXT|TARGET]] / [[TEXT->TARGET]] / [[TARGET<-TEXT]] 的 TARGET，只有 TEXT 的不算"""
+    targets = []
+    for link in LINK_TARGET.findall(line):
+        if "|" in link:
+            targets.append(link.rsplit("|", 1)[1])
+        elif "->" in link:
+            targets.append(link.rsplit("->", 1)[1])
+        elif "<-" in link:
+            targets.append(link.split("<-", 1)[0])
+    return targets
+
+
+def is_different_link_target(line_zh: str, line_en: str) -> bool:
+    """[[TEXT|TARGET]] 中 TARGET 打错了，和 is_different_event 一样只是不在 <<link>> 里"""
+    if "[[" not in line_en:
+        return False
+    targets_en = _link_targets(line_en)
+    if not targets_en:
+        return False
+    return targets_en != _link_targets(line_zh)
+
+
+def is_lack_placeholder(line_zh: str, line_en: str) -> bool:
+    """英文里的 $VAR / _var 中文里没有"""
+    if "$" not in line_en and "_" not in line_en:
+        return False
+    placeholders_en = set(PLACEHOLDER.findall(line_en))
+    return bool(placeholders_en) and not placeholders_en <= set(PLACEHOLDER.findall(line_zh))
+
+
+"""规则名: (检查函数, 日志里的说明)"""
+LINT_RULES: Dict[str, Tuple[Callable[[str, str], bool], str]] = {
+    "full_comma": (is_full_comma, "可能的全角逗号错误"),
+    "lack_angle": (is_lack_angle, "可能的尖括号数量错误"),
+    "different_event": (is_different_event, "可能的错译额外内容"),
+    "different_link_target": (is_different_link_target, "可能的链接目标错误"),
+    "lack_placeholder": (is_lack_placeholder, "可能的变量名错误"),
+}
+
+
+class Linter:
+    """不碰游戏文件，单独检查汉化包里的每一条翻译"""
+
+    @staticmethod
+    def paratranz_link(zh: str) -> str:
+        return f"https://paratranz.cn/projects/{PARATRANZ_PROJECT_ID}/strings?text={quote(zh)}"
+
+    @classmethod
+    def lint_row(cls, en: str, zh: str) -> List[str]:
+        """这一条违反的规则名"""
+        return [name for name, (check, _) in LINT_RULES.items() if check(zh, en)]
+
+    @classmethod
+    def lint_file(cls, csv_file: Path, name: str) -> List[Dict[str, str]]:
+        """检查一个字典文件，可能跑在子进程里"""
+        issues = []
+        with open(csv_file, "r", encoding="utf-8") as fp:
+            for row in csv.reader(fp):
+                if len(row) < 3:  # 没汉化
+                    continue
+                en, zh = row[-2].strip(), row[-1].strip()
+                if not zh:
+                    continue
+                issues.extend(
+                    {"file": name, "key": row[0], "rule": rule, "en": en, "zh": zh, "link": cls.paratranz_link(zh)}
+                    for rule in cls.lint_row(en, zh)
+                )
+        return issues
+
+    @classmethod
+    def lint(cls, csv_dir: Path = DIR_PARATRANZ / "utf8", report_file: Path = DIR_TEMP_ROOT / "lint_report.json", workers: int = None) -> int:
+        """
+        检查整个汉化包，结果写进 report_file (.json / .csv)
+        :return: 问题条数
+        """
+        logger.info("===== 开始检查汉化 ...")
+        files = sorted(
+            Path(root) / file
+            for root, dir_list, file_list in os.walk(csv_dir)
+            if "失效词条" not in root
+            for file in file_list
+            if file.endswith(".csv")
+        )
+        names = [file.relative_to(csv_dir).as_posix() for file in files]
+
+        workers = os.cpu_count() if workers is None else workers
+        if workers <= 1 or len(files) <= 1:
+            results = map(cls.lint_file, files, names)
+            issues = [issue for result in results for issue in result]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+                results = pool.map(cls.lint_file, files, names, chunksize=max(1, len(files) // (workers * 4)))
+                issues = [issue for result in results for issue in result]
+
+        cls.write_report(issues, report_file)
+        for rule, (_, description) in LINT_RULES.items():
+            count = sum(issue["rule"] == rule for issue in issues)
+            if count:
+                logger.warning(f"\t!!! {description}: {count} 条")
+        logger.info(f"##### 汉化检查完毕, 共 {len(files)} 个文件, {len(issues)} 条问题, 详见 {report_file}\n")
+        return len(issues)
+
+    @staticmethod
+    def write_report(issues: List[Dict[str, str]], report_file: Path):
+        """按后缀写 json 或 csv"""
+        os.makedirs(report_file.parent, exist_ok=True)
+        if report_file.suffix == ".csv":
+            with open(report_file, "w", encoding="utf-8-sig", newline="") as fp:
+                writer = csv.DictWriter(fp, fieldnames=["file", "key", "rule", "en", "zh", "link"])
+                writer.writeheader()
+                writer.writerows(issues)
+            return
+        with open(report_file, "w", encoding="utf-8") as fp:
+            json.dump(issues, fp, ensure_ascii=False, indent=2)
+
+
+__all__ = [
+    "LINT_RULES",
+    "Linter"
+]
+
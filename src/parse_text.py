@@ -1,20 +1,281 @@
 import re
 from pathlib import Path
-from typing import List, Union, Set
+from typing import Callable, Dict, FrozenSet, List, Match, Optional, Pattern, Sequence, Tuple, Union, Set
 
 from . import logger
 from .consts import *
+from .line_rules import Block, LineRules, Rule, States
+
+
+class HighRateLinkMatcher:
+    """HIGH_RATE_LINKS 拼成一个正则，提取和覆写都用它，一行只扫一遍"""
+
+    def __init__(self, links: Dict[str, str]):
+        """每个 key 包一层命名组 k0 / k1 ...，key 里自己带括号也不会错位"""
+        self._translations = {f"k{idx}": translation for idx, translation in enumerate(links.values())}
+        self.pattern = re.compile(
+            r"<<link \[\[(?:" + "|".join(f"(?P<k{idx}>{key})" for idx, key in enumerate(links)) + ")"
+        )
+
+    def search(self, line: str) -> bool:
+        """有没有高频选项"""
+        return "<<link [[" in line and self.pattern.search(line) is not None
+
+    def subn(self, line: str) -> Tuple[str, int]:
+        """所有高频选项一次换成汉化"""
+        if "<<link [[" not in line:
+            return line, 0
+        return self.pattern.subn(self._replace, line)
+
+    def _replace(self, match: Match) -> str:
+        """只换开头的选项词，后面的空格和 | 原样留着，和以前逐个 replace("[[Next", "[[继续") 一样"""
+        key = match.group(match.lastgroup)
+        word = re.match(r"\w*", key).end()
+        return f"<<link [[{self._translations[match.lastgroup]}{key[word:]}"
+
+
+HIGH_RATE_LINK_MATCHER = HighRateLinkMatcher(HIGH_RATE_LINKS)
+
+
+"""判断用的正则，模块加载时编译一次；只问有没有的都用 search"""
+PREDICATE_PATTERNS: Dict[str, Pattern] = {
+    "json_line": re.compile(r"^[\w\"]*\s*:\s*[ \'/\$\.\w\":,\|\(\)\{\}\[\]]+,*$"),
+    "alnum": re.compile(r"[A-Za-z\d]"),
+    "tag_span": re.compile(r'<span.*?>[\"\w\.]'),
+    "tag_label": re.compile(r"<label>\w|\w</label>"),
+    "tag_input": re.compile(r"<input.*?value=\""),
+    "widget_note": re.compile(r"<<note\s\""),
+    "widget_if": re.compile(r"<<if\s.*?>>\w"),
+    "widget_option": re.compile(r"<<option\s\""),
+    "widget_link": re.compile(r"<<link\s*(?:\[\[|\"\w)"),
+    "widget_set_to_list": re.compile(r"<<set (?:(?:\$|_)[^_][#;\w\.\(\)\[\]\"\'`]*) to \[[\"\'`\w,\s]*\]>>"),
+    "widget_case_number": re.compile(r"<<case \d"),
+    "start_word": re.compile(r"^(?:\w|- )"),
+    "start_quote_word": re.compile(r"^\"\w"),
+    "only_widgets_widget": re.compile(r"(<<(?:[^<>]*?|for.*?)>>)"),
+    "only_widgets_tag": re.compile(r"(<[/\s\w\"=\-@\$\+\'\.]*>)"),
+    "only_widgets_var": re.compile(r"((?:\$|_)[^_][#;\w\.\(\)\[\]\"\'`]*)"),
+    "only_widgets_markup": re.compile(r"(?:\s*(?:<<[^<>]*>>|<[/\s\w\"=\-@\$\+\'\.]*>))*\s*"),
+    "only_widgets_first": re.compile(r"[<$_]"),
+    "only_widgets_opener": re.compile(r"[$_]"),
+    "only_widgets_tag_body": re.compile(r"[/\s\w\"=\-@\$\+\'\.]*"),
+    "only_widgets_var_body": re.compile(r"[#;\w\.\(\)\[\]\"\'`]*"),
+    "non_space": re.compile(r"\S"),
+}
+
+"""ParseTextTwee.is_comment 认的开头"""
+COMMENT_PREFIXES = ("/*", "<!--", "*")
+
+"""单独一行的半拉 widget，算只有 widget"""
+ONLY_WIDGETS_HALVES = frozenset({"<<print either(", "<<print ["})
+
+
+class WidgetPrintMatcher:
+    """
+    <<print xxx>>，判断结果和以前的正则 <<print\s[^<]*[\"\'`\w]+[...]+(?:\)>>|\">>|...) 一样，但是线性时间:
+    以前三段字符集互相重叠，没闭合的长 <<print 会回溯到 O(n^3)
+    """
+    HEAD = re.compile(r"<<print\s")
+    WORD = re.compile(r"[\"\'`\w]")
+    BODY = re.compile(r"[\?\s\w\.\$,\'\"<>\[\]\(\)/]*")
+    END = re.compile(r"[\)\"\'\]]>>")
+
+    def match(self, line: str, pos: int = 0) -> bool:
+        """<<print 正好从 pos 开始"""
+        return self.HEAD.match(line, pos) is not None and self._match_body(line, pos + 8, 0)[0]
+
+    def search(self, line: str, pos: int = 0) -> bool:
+        """pos 之后任意一个 <<print 能匹配"""
+        if line.find("<<print", pos) < 0:
+            return False
+        skip = 0
+        for head in self.HEAD.finditer(line, pos):
+            matched, skip = self._match_body(line, head.end(), skip)
+            if matched:
+                return True
+        return False
+
+    def _match_body(self, line: str, start: int, skip: int) -> Tuple[bool, int]:
+        """
+        [\"\'`\w]+ 只取最后一个字符也一样，所以挨个试 < 之前的引号/单词字符 idx:
+        idx 后面 BODY 一整段里 (至少隔一个字符) 有 )>> ">> 等结尾，或者这一段正好停在 `>> 上；
+        同一段里后面的 idx 能找的范围只会更小，失败了就跳到这一段末尾，
+        这个位置作为 skip 传给下一个 <<print，整行每个字符只看常数次
+        """
+        stop = line.find("<", start)
+        stop = len(line) if stop < 0 else stop
+        pos = max(start, skip)
+        while True:
+            word = self.WORD.search(line, pos, stop)
+            if word is None:
+                return False, pos
+            idx = word.start()
+            end = self.BODY.match(line, idx + 1).end()
+            if end >= idx + 2 and (self.END.search(line, idx + 2, end) or line.startswith("`>>", end)):
+                return True, end
+            pos = end
+
+
+WIDGET_PRINT_MATCHER = WidgetPrintMatcher()
+
+"""
+<<set KEY ... to ...>>，KEY 是变量名的正则，不同的 KEY 组合各编译一个；
+KEY 后面那一段只要第一个 to / + / (，用 (?=(...))(?P=...) 固定下来不再回溯 (3.8 没有原子组)，
+以前 [...]* 和 .*? 来回回溯，一串运算符后面没有结尾时是 O(n^2)
+"""
+WIDGET_SET_TO_TEMPLATE = (
+    r"<<set\s(?:{keys})(?=(?P<name>[\'\"\w\s\[\]\$\+\.\(\)\{{\}}:\-]*?(?:to|\+|\()))(?P=name)"
+    r".*?[\w\{{\"\'`](?:\w| \w|<<|\"\w)"
+)
+_WIDGET_SET_TO_PATTERNS: Dict[FrozenSet[str], Pattern] = {}
+
+
+def widget_set_to_pattern(keys: Set[str]) -> Pattern:
+    """按 KEY 组合取编译好的 <<set>> 正则，没有就编译一个存起来"""
+    keys = frozenset(keys)
+    pattern = _WIDGET_SET_TO_PATTERNS.get(keys)
+    if pattern is None:
+        pattern = _WIDGET_SET_TO_PATTERNS[keys] = re.compile(
+            WIDGET_SET_TO_TEMPLATE.format(keys="|".join(sorted(keys)))
+        )
+    return pattern
+
+
+class NormalLineClassifier:
+    """
+    parse_normal 的单行判断，一行只扫一遍:
+    一个正则找出所有 < 后面跟着的标记，按标记名只跑对应的那个正则 (从这个位置开始 match)，
+    结果和挨个 is_* 判断完全一样；print / set 从第一个标记往后整行 search 一次，后面同名的标记不再看
+    """
+    MARKERS = re.compile(
+        r"<(?:(?P<span>span)|(?P<label>label>)|(?P<label_end>/label>)|(?P<input>input)"
+        r"|<(?:(?P<note>note)|(?P<print>print)|(?P<option>option)|(?P<link>link)|(?P<set>set)))"
+    )
+    SEARCHES = frozenset({"print", "set"})
+    LABEL = re.compile(r"<label>\w")
+    LABEL_END = re.compile(r"\w</label>")
+    SET_TO_KEYS = {
+        r"\$_strings", r"\$_text_output", "_text_output",
+        r"\$_customertype", r"\$_theboy", "_clothesDesc"
+    }
+
+    def __init__(self):
+        set_to = widget_set_to_pattern(self.SET_TO_KEYS)
+        set_to_list = PREDICATE_PATTERNS["widget_set_to_list"]
+        self._checks = {
+            "span": PREDICATE_PATTERNS["tag_span"].match,
+            "label": self.LABEL.match,
+            "label_end": lambda line, pos: pos > 0 and self.LABEL_END.match(line, pos - 1),
+            "input": PREDICATE_PATTERNS["tag_input"].match,
+            "note": PREDICATE_PATTERNS["widget_note"].match,
+            "print": WIDGET_PRINT_MATCHER.search,
+            "option": PREDICATE_PATTERNS["widget_option"].match,
+            "set": lambda line, pos: (
+                ("<<set " in line and set_to.search(line, pos))
+                or set_to_list.search(line, pos) is not None
+            ),
+        }
+        self._link = PREDICATE_PATTERNS["widget_link"].match
+
+    def is_text(self, line: str, maybe_json: bool = False) -> bool:
+        """line 已经 strip 过，True 是要提取"""
+        if ParseTextTwee.is_comment(line) or "::" in line or ParseTextTwee.is_only_marks(line):
+            return False
+        if "<" not in line:
+            return not (maybe_json and ParseTextTwee.is_json_line(line))
+
+        link = False
+        searched = set()
+        for marker in self.MARKERS.finditer(line):
+            name, pos = marker.lastgroup, marker.start()
+            if name == "link":
+                link = link or bool(self._link(line, pos))
+            elif name in searched:
+                continue
+            elif self._checks[name](line, pos):
+                return True
+            elif name in self.SEARCHES:
+                searched.add(name)
+        if link and not HIGH_RATE_LINK_MATCHER.search(line):
+            return True
+        return not (ParseTextTwee.is_only_widgets(line) or (maybe_json and ParseTextTwee.is_json_line(line)))
+
+
+def multirow_comment(
+    starts: Tuple[str, ...] = ("/*", "<!--"),
+    ends: Tuple[str, ...] = ("*/", "-->"),
+    exit_anywhere: bool = False
+) -> Block:
+    """跨行注释，逆天；有的文件把 <<set / <<error { 也当注释跳过"""
+    return Block(
+        "multirow_comment",
+        enter=lambda line: line.startswith(starts) and all(_ not in line for _ in ends),
+        exit=lambda line: line.endswith(ends),
+        exit_anywhere=exit_anywhere
+    )
+
+
+"""跨行script，逆天"""
+MULTIROW_SCRIPT = Block(
+    "multirow_script",
+    enter=lambda line: line == "<<script>>",
+    exit=lambda line: line == "<</script>>"
+)
+"""跨行run，逆天"""
+MULTIROW_RUN = Block(
+    "multirow_run",
+    enter=lambda line: line.startswith("<<run ") and ">>" not in line,
+    exit=lambda line: line in {"})>>", "}>>"}
+)
+"""跨行if，逆天"""
+MULTIROW_IF = Block(
+    "multirow_if",
+    enter=lambda line: line.startswith("<<if ") and ">>" not in line,
+    exit=lambda line: ">>" in line
+)
+"""突如其来的json，只记状态"""
+MAYBE_JSON = Block(
+    "maybe_json",
+    enter=lambda line: (line.startswith(("<<set ", "<<error {")) and ">>" not in line) or line.endswith(("[", "{", "(")),
+    exit=lambda line: ">>" in line,
+    track=True
+)
+"""注释、事件、纯符号都不要"""
+SKIP_MARKUP = Rule(
+    "skip",
+    lambda line: ParseTextTwee.is_comment(line) or ParseTextTwee.is_event(line) or ParseTextTwee.is_only_marks(line),
+    False
+)
 
 
 class ParseTextTwee:
+    """编译好的规则表，name -> LineRules"""
+    _RULES: Dict[str, LineRules] = {}
 
-    def __init__(self, lines: List[str], filepath: Path):
+    def __init__(self, lines: List[str], filepath: Path, entry_states: Dict[str, States] = None):
         self._lines = lines
         self._filepath = filepath
 
         self._filename = self._filepath.name  # 文件名
         self._filedir = self._filepath.parent  # 文件夹
 
+        """只解析文件里的一段时: 上一段结束时各规则表的状态；解析完是这一段结束时的"""
+        self._entry_states: Dict[str, States] = entry_states or {}
+        self.exit_states: Dict[str, States] = dict(self._entry_states)
+
+    @property
+    def dispatch_key(self) -> Tuple[str, str, str]:
+        """parse 只按这几样选规则，一样就一定走同一套"""
+        return self._filedir.parent.name, self._filedir.name, self._filename
+
+    def _run_rules(self, name: str, build: Callable[[], Sequence[Union[Block, Rule]]], default: bool = False) -> List[bool]:
+        """规则表第一次用到时才建、才编译，之后同一个类里按 name 复用；从上一段的状态接着跑"""
+        rules = self._RULES.get(name)
+        if rules is None:
+            rules = self._RULES[name] = LineRules(name, build(), default)
+        results, self.exit_states[name] = rules.run_from(self._lines, self._entry_states.get(name))
+        return results
+
     def parse(self) -> List[bool]:
         if DirNamesTwee.NORMAL.value in self._filedir.name:
             return self.parse_normal()
@@ -78,7 +339,7 @@ class ParseTextTwee:
             line.strip() and (
                 "<span " in line.strip()
                 or "<<link [[" in line.strip()
-                or any(re.findall(r"^(\w|- )", line.strip()))
+                or PREDICATE_PATTERNS["start_word"].search(line.strip()) is not None
             ) for line in self._lines
         ]
 
@@ -111,34 +372,16 @@ class ParseTextTwee:
 
     def _parse_passage_footer(self):
         """有点麻烦"""
-        results = []
-        multirow_error_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行error，逆天"""
-            if line in ["<<error {", "<<script>>"]:
-                multirow_error_flag = True
-                results.append(False)
-                continue
-            elif line in ["}>>", "<</script>>"]:
-                multirow_error_flag = False
-                results.append(False)
-                continue
-            elif multirow_error_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif "<span" in line or "<<link" in line or not line.startswith("<"):
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("passage_footer", lambda: (
+            Block(
+                "multirow_error",
+                enter=lambda line: line in {"<<error {", "<<script>>"},
+                exit=lambda line: line in {"}>>", "<</script>>"},
+                exit_anywhere=True
+            ),
+            SKIP_MARKUP,
+            Rule("text", lambda line: "<span" in line or "<<link" in line or not line.startswith("<")),
+        ))
 
     """√ base-clothing """
     def parse_base_clothing(self):
@@ -159,31 +402,16 @@ class ParseTextTwee:
 
     def _parse_captiontext(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif self.is_tag_span(line) or self.is_widget_set_to(line, {
-                r"\$_text_output", "_wearing", r"\$_output",
-                "_finally", r"\$_verb", "_output",
-                "_text_output", r"\$_pair", r"\$_a"
-            }):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-
-        return results
+        set_to = widget_set_to_pattern({
+            r"\$_text_output", "_wearing", r"\$_output",
+            "_finally", r"\$_verb", "_output",
+            "_text_output", r"\$_pair", r"\$_a"
+        })
+        return self._run_rules("captiontext", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or set_to.search(line)),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_clothing(self):
         """json"""
@@ -191,72 +419,31 @@ class ParseTextTwee:
 
     def _parse_clothing_sets(self):
         """好麻烦"""
-        results = []
-        multirow_comment_flag = False
-        multirow_script_flag = False
-        multirow_json_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if (line in ["/*", "<!--"] or (any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"}))):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif multirow_comment_flag and (line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"})):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            """跨行script，逆天"""
-            if line == "<<script>>":
-                multirow_script_flag = True
-                results.append(False)
-                continue
-            elif multirow_script_flag and line == "<</script>>":
-                multirow_script_flag = False
-                results.append(False)
-                continue
-            elif multirow_script_flag:
-                results.append(False)
-                continue
-
-            """就为这一个单开一档，逆天"""
-            if (line.startswith("<<run ") or line.startswith("<<set ")) and "}>>" not in line:
-                multirow_json_flag = True
-                results.append(False)
-                continue
-            elif "}>>" in line:
-                multirow_json_flag = False
-                results.append(False)
-                continue
-            elif multirow_json_flag and any(_ in line for _ in {'"start"', '"joiner"', '"end"'}) and line != '"end": ".",':
-                results.append(True)
-                continue
-            elif multirow_json_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
-                or self.is_tag_label(line)
-                or self.is_widget_option(line)
-                or self.is_widget_link(line)
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("clothing_sets", lambda: (
+            multirow_comment(),
+            MULTIROW_SCRIPT,
+            Block(  # 就为这一个单开一档，逆天
+                "multirow_json",
+                enter=lambda line: line.startswith(("<<run ", "<<set ")) and "}>>" not in line,
+                exit=lambda line: "}>>" in line,
+                inside=None,
+                exit_anywhere=True
+            ),
+            Rule(
+                "json_text",
+                lambda line: any(_ in line for _ in {'"start"', '"joiner"', '"end"'}) and line != '"end": ".",',
+                state="multirow_json"
+            ),
+            Rule("json", result=False, state="multirow_json"),
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
+                ParseTextTwee.is_tag_span(line)
+                or ParseTextTwee.is_tag_label(line)
+                or ParseTextTwee.is_widget_option(line)
+                or ParseTextTwee.is_widget_link(line)
+            )),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_clothing_images(self):
         """只有 <span"""
@@ -268,43 +455,20 @@ class ParseTextTwee:
 
     def _parse_wardrobes(self):
         """多了一个<<wearlink_norefresh " """
-        results = []
-        multirow_if_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行if，逆天"""
-            if line.startswith("<<if ") and ">>" not in line:
-                multirow_if_flag = True
-                results.append(False)
-                continue
-            elif multirow_if_flag and ">>" in line:
-                multirow_if_flag = False
-                results.append(False)
-                continue
-            elif multirow_if_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
+        set_to = widget_set_to_pattern({r"\$_text_output", r"\$_output"})
+        return self._run_rules("wardrobes", lambda: (
+            MULTIROW_IF,
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
+                ParseTextTwee.is_tag_span(line)
                 or '<<wearlink_norefresh "' in line
-                or self.is_tag_label(line)
-                or self.is_widget_option(line)
-                or (self.is_widget_link(line) and not self.is_widget_high_rate_link(line))
-                or self.is_widget_set_to(line, {r"\$_text_output", r"\$_output"})
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line) or self.is_json_line(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+                or ParseTextTwee.is_tag_label(line)
+                or ParseTextTwee.is_widget_option(line)
+                or (ParseTextTwee.is_widget_link(line) and not ParseTextTwee.is_widget_high_rate_link(line))
+                or set_to.search(line)
+            )),
+            Rule("widgets", lambda line: ParseTextTwee.is_only_widgets(line) or ParseTextTwee.is_json_line(line), False),
+        ), default=True)
 
     """√ base-combat """
     def parse_base_combat(self):
@@ -342,85 +506,32 @@ class ParseTextTwee:
 
     def _parse_actions(self):
         """麻烦"""
-        results = []
-        multirow_if_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行if，逆天"""
-            if line.startswith("<<if ") and ">>" not in line:
-                multirow_if_flag = True
-                results.append(False)
-                continue
-            elif multirow_if_flag and ">>" in line:
-                multirow_if_flag = False
-                results.append(False)
-                continue
-            elif multirow_if_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line) or line == "<<print either(":
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
-                or self.is_tag_label(line)
-                or self.is_widget_set_to(line, {
-                    "_leftaction", "_rightaction", "_feetaction",
-                    "_targetlistarms", "_targetlistall", "_mouthaction",
-                    "_anusaction", "_actions", "_undressLeftTargets",
-                    "_undressRightTargets", "_handGuideOptions", "_penisaction",
-                    "_askActions", "_vaginaaction", "_text_output", "_chestaction",
-                    "_thighaction", "_npccr", "_npcff"
-                })
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line) or self.is_json_line(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({
+            "_leftaction", "_rightaction", "_feetaction",
+            "_targetlistarms", "_targetlistall", "_mouthaction",
+            "_anusaction", "_actions", "_undressLeftTargets",
+            "_undressRightTargets", "_handGuideOptions", "_penisaction",
+            "_askActions", "_vaginaaction", "_text_output", "_chestaction",
+            "_thighaction", "_npccr", "_npcff"
+        })
+        return self._run_rules("actions", lambda: (
+            MULTIROW_IF,
+            SKIP_MARKUP,
+            Rule("print_either", lambda line: line == "<<print either(", False),
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or ParseTextTwee.is_tag_label(line) or set_to.search(line)),
+            Rule("widgets", lambda line: ParseTextTwee.is_only_widgets(line) or ParseTextTwee.is_json_line(line), False),
+        ), default=True)
 
     def _parse_stalk(self):
         """麻烦"""
-        results = []
-        multirow_if_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行if，逆天"""
-            if line.startswith("<<if ") and ">>" not in line:
-                multirow_if_flag = True
-                results.append(False)
-                continue
-            elif multirow_if_flag and ">>" in line:
-                multirow_if_flag = False
-                results.append(False)
-                continue
-            elif multirow_if_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line) or line == "<<print either(":
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
-                or self.is_widget_set_to(line, {
-                    "_wraith_output"
-                })
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line) or self.is_json_line(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_wraith_output"})
+        return self._run_rules("stalk", lambda: (
+            MULTIROW_IF,
+            SKIP_MARKUP,
+            Rule("print_either", lambda line: line == "<<print either(", False),
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or set_to.search(line)),
+            Rule("widgets", lambda line: ParseTextTwee.is_only_widgets(line) or ParseTextTwee.is_json_line(line), False),
+        ), default=True)
 
     def _parse_generation(self):
         """只有 <span """
@@ -428,92 +539,38 @@ class ParseTextTwee:
 
     def _parse_tentacle_adv(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-                or line == "_tentacle.desc"
-            ):
-                results.append(False)
-            elif self.is_tag_span(line) or self.is_widget_actions_tentacle(line) or self.is_widget_if(line):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("tentacle_adv", lambda: (
+            SKIP_MARKUP,
+            Rule("tentacle_desc", lambda line: line == "_tentacle.desc", False),
+            Rule("text", lambda line: (
+                ParseTextTwee.is_tag_span(line)
+                or ParseTextTwee.is_widget_actions_tentacle(line)
+                or ParseTextTwee.is_widget_if(line)
+            )),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_tentacles(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-                or self.is_only_widgets(line)
-            ):
-                results.append(False)
-            elif '{"desc":' in line or "you" in line.lower():
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("tentacles", lambda: (
+            SKIP_MARKUP,
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+            Rule("text", lambda line: '{"desc":' in line or "you" in line.lower()),
+        ))
 
     def _parse_combat_effects(self):
         """有点麻烦"""
-        results = []
-        multirow_widget_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/script，逆天"""
-            if (
-                line in ["/*", "<!--"]
-                or (
-                    any(line.startswith(_) for _ in {"/*", "<!--"})
-                    and all(_ not in line for _ in {"*/", "-->"})
-                )
-            ):
-                multirow_widget_flag = True
-                results.append(False)
-                continue
-            elif multirow_widget_flag and line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"}):
-                multirow_widget_flag = False
-                results.append(False)
-                continue
-            elif multirow_widget_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
-                or self.is_widget_print(line)
-                or self.is_widget_set_to(line, {"_wraith_output"})
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line) or self.is_json_line(line) or ("<<set " in line and ">>" not in line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_wraith_output"})
+        return self._run_rules("combat_effects", lambda: (
+            multirow_comment(exit_anywhere=True),
+            SKIP_MARKUP,
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or ParseTextTwee.is_widget_print(line) or set_to.search(line)),
+            Rule("widgets", lambda line: (
+                ParseTextTwee.is_only_widgets(line)
+                or ParseTextTwee.is_json_line(line)
+                or ("<<set " in line and ">>" not in line)
+            ), False),
+        ), default=True)
 
     def _parse_npc_span(self):
         """只有 <span"""
@@ -521,170 +578,78 @@ class ParseTextTwee:
 
     def _parse_speech_sydney(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif (
-                self.is_widget_set_to(line, {"_sydneyText"})
-                or line.startswith("`")
-            ):
-                results.append(True)
-            elif (
-                self.is_only_widgets(line)
-                or ("<<set " in line and ">>" not in line)
-            ):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_sydneyText"})
+        return self._run_rules("speech_sydney", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: set_to.search(line) or line.startswith("`")),
+            Rule("widgets", lambda line: ParseTextTwee.is_only_widgets(line) or ("<<set " in line and ">>" not in line), False),
+        ), default=True)
 
     def _parse_speech(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif (
-                self.is_widget_set_to(line, {r"\$_text_output", r"\$_sexToy", r"\$_strings"})
-                or line.startswith('"')
-                or line.startswith('`')
-                or line.startswith('<<default>>')
-                or line.startswith('<<He>> ')
-                or line.startswith('<<bHe>> ')
+        set_to = widget_set_to_pattern({r"\$_text_output", r"\$_sexToy", r"\$_strings"})
+        case_number = PREDICATE_PATTERNS["widget_case_number"]
+        return self._run_rules("speech", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
+                set_to.search(line)
+                or line.startswith(('"', '`', '<<default>>', '<<He>> ', '<<bHe>> '))
                 or "<span " in line
-                or any(re.findall(r"<<case \d", line))
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(False)
-        return results
+                or case_number.search(line)
+            )),
+        ))
 
     def _parse_struggle(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-                or self.is_json_line(line)
-            ):
-                results.append(False)
-            elif self.is_widget_set_to(line, {
-                r"\$_text_output", "_text_output", "_targetlistall",
-                "_leftaction", "_feetaction", "_mouthaction",
-                "_targetlistarms", "_rightaction"
-            }):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({
+            r"\$_text_output", "_text_output", "_targetlistall",
+            "_leftaction", "_feetaction", "_mouthaction",
+            "_targetlistarms", "_rightaction"
+        })
+        return self._run_rules("struggle", lambda: (
+            SKIP_MARKUP,
+            Rule("json", ParseTextTwee.is_json_line, False),
+            Rule("text", set_to.search),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_swarms(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-                or self.is_json_line(line)
-            ):
-                results.append(False)
-            elif self.is_widget_set_to(line, {
-                "_leftaction", "_rightaction", "_feetaction",
-                "_targetlistarms", "_targetlistall"
-            }):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({
+            "_leftaction", "_rightaction", "_feetaction",
+            "_targetlistarms", "_targetlistall"
+        })
+        return self._run_rules("swarms", lambda: (
+            SKIP_MARKUP,
+            Rule("json", ParseTextTwee.is_json_line, False),
+            Rule("text", set_to.search),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_swarm_effects(self):
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                "<" in line and (
-                    self.is_tag_span(line)
-                    or self.is_tag_label(line)
-                    or ("<<set " in line and self.is_widget_set_to(line, {
-                        "_leftaction", "_rightaction", "_feetaction",
-                        "_targetlistarms", "_targetlistall"
-                    }))
-                )
-            ):
-                results.append(True)
-            elif "<" in line and (self.is_only_widgets(line) or self.is_json_line(line)):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({
+            "_leftaction", "_rightaction", "_feetaction",
+            "_targetlistarms", "_targetlistall"
+        })
+        return self._run_rules("swarm_effects", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: "<" in line and (
+                ParseTextTwee.is_tag_span(line)
+                or ParseTextTwee.is_tag_label(line)
+                or ("<<set " in line and set_to.search(line))
+            )),
+            Rule("widgets", lambda line: "<" in line and (ParseTextTwee.is_only_widgets(line) or ParseTextTwee.is_json_line(line)), False),
+        ), default=True)
 
     def _parse_combat_widgets(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-                or self.is_json_line(line)
-            ):
-                results.append(False)
-            elif self.is_tag_span(line) or self.is_widget_set_to(line, {"_text_output"}):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_text_output"})
+        return self._run_rules("combat_widgets", lambda: (
+            SKIP_MARKUP,
+            Rule("json", ParseTextTwee.is_json_line, False),
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or set_to.search(line)),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     """ base-debug """
     def parse_base_debug(self):
@@ -759,67 +724,35 @@ class ParseTextTwee:
 
     def _parse_characteristic(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif (
+        set_to = widget_set_to_pattern({
+            "_trimester",  "_vaginaWetnessTextConfig",
+            "_childType", r"\$_pregnancyRisk", r"\$_number",
+            "_milkCapacityTextConfig", r"\$_heatRutDisplay"
+        })
+        return self._run_rules("characteristic", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
                 "description: " in line
                 or "{ name :" in line
                 or "preText: " in line
                 or line == '<<if $_number isnot "an unknown number of" and $_number isnot "more than one" and $_number gt 1>>'
-                or self.is_tag_span(line)
-                or self.is_widget_set_to(line, {
-                    "_trimester",  "_vaginaWetnessTextConfig",
-                    "_childType", r"\$_pregnancyRisk", r"\$_number",
-                    "_milkCapacityTextConfig", r"\$_heatRutDisplay"
-                })
-            ):
-                results.append(True)
-            elif (
-                self.is_only_widgets(line)
+                or ParseTextTwee.is_tag_span(line)
+                or set_to.search(line)
+            )),
+            Rule("widgets", lambda line: (
+                ParseTextTwee.is_only_widgets(line)
                 or ("<<set " in line and ">>" not in line and "preText: " not in line)
                 or line == "states : ["
-            ):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+            ), False),
+        ), default=True)
 
     def _parse_social(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                self.is_comment(line)
-                or self.is_event(line)
-                or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif "description: '" in line or self.is_tag_span(line) or "preText: " in line:
-                results.append(True)
-            elif (
-                self.is_json_line(line)
-                or self.is_only_widgets(line)
-            ):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("social", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: "description: '" in line or ParseTextTwee.is_tag_span(line) or "preText: " in line),
+            Rule("widgets", lambda line: ParseTextTwee.is_json_line(line) or ParseTextTwee.is_only_widgets(line), False),
+        ), default=True)
 
     def _parse_traits(self):
         """half-json"""
@@ -827,26 +760,12 @@ class ParseTextTwee:
 
     def _parse_body_writing(self):
         """有点麻烦"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if (
-                    self.is_comment(line)
-                    or self.is_event(line)
-                    or self.is_only_marks(line)
-            ):
-                results.append(False)
-            elif self.is_widget_set_to(line, {"_text_output"}) or self.is_tag_span(line):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_text_output"})
+        return self._run_rules("body_writing", lambda: (
+            SKIP_MARKUP,
+            Rule("text", lambda line: set_to.search(line) or ParseTextTwee.is_tag_span(line)),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_body_writing_objects(self):
         """half-json"""
@@ -854,36 +773,17 @@ class ParseTextTwee:
 
     def _parse_caption(self):
         """竟然还有css"""
-        results = []
-        multirow_style_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/script，逆天"""
-            if line == "<style>":
-                multirow_style_flag = True
-                results.append(False)
-                continue
-            elif line == "</style>":
-                multirow_style_flag = False
-                results.append(False)
-                continue
-            elif multirow_style_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif self.is_tag_span(line) or self.is_widget_button(line):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("caption", lambda: (
+            Block(
+                "multirow_style",
+                enter=lambda line: line == "<style>",
+                exit=lambda line: line == "</style>",
+                exit_anywhere=True
+            ),
+            SKIP_MARKUP,
+            Rule("text", lambda line: ParseTextTwee.is_tag_span(line) or ParseTextTwee.is_widget_button(line)),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_sex_stat(self):
         """纯文本"""
@@ -891,26 +791,15 @@ class ParseTextTwee:
 
     def _parse_feats(self):
         """json"""
-        results = []
-        json_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if line in {"missing:{", "name:{"}:
-                json_flag = True
-                results.append(False)
-            elif line == "},":
-                json_flag = False
-                results.append(False)
-            elif json_flag:
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+        return self._run_rules("feats", lambda: (
+            Block(
+                "json",
+                enter=lambda line: line in {"missing:{", "name:{"},
+                exit=lambda line: line == "},",
+                inside=True,
+                exit_anywhere=True
+            ),
+        ))
 
     def _parse_system_images(self):
         """只有span"""
@@ -926,37 +815,12 @@ class ParseTextTwee:
 
     def _parse_named_npcs(self):
         """有点麻烦"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/set，逆天"""
-            if line in ["/*", "<!--", "<<set "] or (any(line.startswith(_) for _ in {"/*", "<!--", "<<set "}) and all(
-                    _ not in line for _ in {"*/", "-->", ">>"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->", ">>"] or any(line.endswith(_) for _ in {"*/", "-->", ">>"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif self.is_tag_span(line):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("named_npcs", lambda: (
+            multirow_comment(("/*", "<!--", "<<set "), ("*/", "-->", ">>"), exit_anywhere=True),  # 跨行注释/set，逆天
+            SKIP_MARKUP,
+            Rule("text", ParseTextTwee.is_tag_span),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_nicknames(self):
         """只有 " """
@@ -968,115 +832,42 @@ class ParseTextTwee:
 
     def _parse_radio(self):
         """有点麻烦"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if line in ["/*", "<!--"] or (
-                    any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line):
-                results.append(False)
-            elif (
-                self.is_widget_link(line)
+        start_quote_word = PREDICATE_PATTERNS["start_quote_word"]
+        return self._run_rules("radio", lambda: (
+            multirow_comment(exit_anywhere=True),
+            Rule("skip", lambda line: ParseTextTwee.is_comment(line) or ParseTextTwee.is_event(line), False),
+            Rule("text", lambda line: (
+                ParseTextTwee.is_widget_link(line)
                 or "<i>" in line
                 or "<b>" in line
-                or any(re.findall(r"^\"\w", line))
-            ):
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+                or start_quote_word.search(line)
+            )),
+        ))
 
     def _parse_settings(self):
         """草"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/error，逆天"""
-            if line in ["/*", "<!--", "<<error {"] or (any(line.startswith(_) for _ in {"/*", "<!--", "<<error {"}) and all(_ not in line for _ in {"*/", "-->", "}>>"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->", "}>>"] or any(line.endswith(_) for _ in {"*/", "-->", "}>>"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                self.is_widget_button(line)
-                or self.is_tag_span(line)
-                or self.is_tag_label(line)
-                or self.is_tag_input(line)
-                or (self.is_widget_link(line) and not self.is_widget_high_rate_link(line))
+        return self._run_rules("settings", lambda: (
+            multirow_comment(("/*", "<!--", "<<error {"), ("*/", "-->", "}>>"), exit_anywhere=True),  # 跨行注释/error，逆天
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
+                ParseTextTwee.is_widget_button(line)
+                or ParseTextTwee.is_tag_span(line)
+                or ParseTextTwee.is_tag_label(line)
+                or ParseTextTwee.is_tag_input(line)
+                or (ParseTextTwee.is_widget_link(line) and not ParseTextTwee.is_widget_high_rate_link(line))
                 or "<<set _buttonName " in line or "<<set _name " in line or "<<set _penisNames " in line
-            ):
-                results.append(True)
-            elif ("<" in line and self.is_only_widgets(line)):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+            )),
+            Rule("widgets", lambda line: "<" in line and ParseTextTwee.is_only_widgets(line), False),
+        ), default=True)
 
     def _parse_skill_difficulties(self):
         """麻烦"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/error，逆天"""
-            if line in ["/*", "<!--", "<<error {"] or (
-                    any(line.startswith(_) for _ in {"/*", "<!--", "<<error {"}) and all(
-                    _ not in line for _ in {"*/", "-->", "}>>"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->", "}>>"] or any(line.endswith(_) for _ in {"*/", "-->", "}>>"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif "<span " in line or "<<set _text_output" in line:
-                results.append(True)
-            elif line.startswith("<"):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("skill_difficulties", lambda: (
+            multirow_comment(("/*", "<!--", "<<error {"), ("*/", "-->", "}>>"), exit_anywhere=True),  # 跨行注释/error，逆天
+            SKIP_MARKUP,
+            Rule("text", lambda line: "<span " in line or "<<set _text_output" in line),
+            Rule("widgets", lambda line: line.startswith("<"), False),
+        ), default=True)
 
     def _parse_sleep(self):
         """<span , <<link, 纯文本"""
@@ -1094,76 +885,21 @@ class ParseTextTwee:
 
     def _parse_tending(self):
         """麻烦"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if line in ["/*", "<!--"] or (
-                    any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line):
-                results.append(False)
-            elif (
-                "<span " in line
-                or "<<link " in line
-                or not line.startswith("<")
-            ):
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("tending", lambda: (
+            multirow_comment(exit_anywhere=True),
+            Rule("skip", lambda line: ParseTextTwee.is_comment(line) or ParseTextTwee.is_event(line), False),
+            Rule("text", lambda line: "<span " in line or "<<link " in line or not line.startswith("<")),
+        ))
 
     def _parse_system_text(self):
         """麻烦"""
-        results = []
-        multirow_comment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if line in ["/*", "<!--"] or (any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"})):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"}):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            if self.is_comment(line) or self.is_event(line):
-                results.append(False)
-            elif (
-                line.startswith('"')
-                or "<span " in line
-                or self.is_widget_set_to(line, {"_text_output", r"\$_text_output"})
-            ):
-                results.append(True)
-            elif self.is_only_widgets(line):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        set_to = widget_set_to_pattern({"_text_output", r"\$_text_output"})
+        return self._run_rules("system_text", lambda: (
+            multirow_comment(exit_anywhere=True),
+            Rule("skip", lambda line: ParseTextTwee.is_comment(line) or ParseTextTwee.is_event(line), False),
+            Rule("text", lambda line: line.startswith('"') or "<span " in line or set_to.search(line)),
+            Rule("widgets", ParseTextTwee.is_only_widgets, False),
+        ), default=True)
 
     def _parse_time(self):
         """只有<span"""
@@ -1190,70 +926,24 @@ class ParseTextTwee:
         ]
 
     def _parse_system_widgets(self):
-        results = []
-        multirow_comment_flag = False
-        multirow_script_flag = False
-        maybe_json_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if (line in ["/*", "<!--"] or (any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"}))):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif multirow_comment_flag and (line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"})):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            """跨行script，逆天"""
-            if line == "<<script>>":
-                multirow_script_flag = True
-                results.append(False)
-                continue
-            elif multirow_script_flag and line == "<</script>>":
-                multirow_script_flag = False
-                results.append(False)
-                continue
-            elif multirow_script_flag:
-                results.append(False)
-                continue
-
-            """突如其来的json"""
-            if (
-                ((line.startswith("<<set ") or line.startswith("<<error {")) and ">>" not in line)
-                or line.endswith("[")
-                or line.endswith("{")
-                or line.endswith("(")
-            ):
-                maybe_json_flag = True
-            elif maybe_json_flag and ">>" in line:
-                maybe_json_flag = False
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                self.is_tag_span(line)
-                or self.is_tag_label(line)
-                or self.is_widget_print(line)
-                or self.is_widget_set_to(line, {r"\$_text_output"})
+        set_to = widget_set_to_pattern({r"\$_text_output"})
+        return self._run_rules("system_widgets", lambda: (
+            multirow_comment(),
+            MULTIROW_SCRIPT,
+            MAYBE_JSON,
+            SKIP_MARKUP,
+            Rule("text", lambda line: (
+                ParseTextTwee.is_tag_span(line)
+                or ParseTextTwee.is_tag_label(line)
+                or ParseTextTwee.is_widget_print(line)
+                or set_to.search(line)
                 or "<<print either(" in line and ">>" in line
                 or 'name: "' in line or 'name : "' in line
-                or (self.is_widget_link(line) and not self.is_widget_high_rate_link(line))
-            ):
-                results.append(True)
-            elif ("<" in line and self.is_only_widgets(line)) or (maybe_json_flag and self.is_json_line(line)):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+                or (ParseTextTwee.is_widget_link(line) and not ParseTextTwee.is_widget_high_rate_link(line))
+            )),
+            Rule("widgets", lambda line: "<" in line and ParseTextTwee.is_only_widgets(line), False),
+            Rule("json", ParseTextTwee.is_json_line, False, state="maybe_json"),
+        ), default=True)
 
     """ flavour-text-generators """
     def parse_flavour_text(self):
@@ -1268,24 +958,15 @@ class ParseTextTwee:
 
     def _parse_body_comments(self):
         """json"""
-        results = []
-        json_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-
-            if "<<set " in line and line.endswith("["):
-                json_flag = True
-                results.append(False)
-            elif json_flag and "]>>" in line:
-                json_flag = False
-                results.append(False)
-            elif json_flag or "<<Penisremarkquote>>" in line:
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("body_comments", lambda: (
+            Block(
+                "json",
+                enter=lambda line: "<<set " in line and line.endswith("["),
+                exit=lambda line: "]>>" in line,
+                inside=True
+            ),
+            Rule("text", lambda line: "<<Penisremarkquote>>" in line),
+        ))
 
     def _parse_exhibitionism(self):
         """json"""
@@ -1297,115 +978,21 @@ class ParseTextTwee:
 
     """ 其它 """
     def parse_normal(self):
-        results = []
-        multirow_comment_flag = False
-        multirow_script_flag = False
-        multirow_run_flag = False
-        multirow_if_flag = False
-        maybe_json_flag = False
-
-        shop_clothes_hint_flag = False  # 草
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释，逆天"""
-            if (line in ["/*", "<!--"] or (any(line.startswith(_) for _ in {"/*", "<!--"}) and all(_ not in line for _ in {"*/", "-->"}))):
-                multirow_comment_flag = True
-                results.append(False)
-                continue
-            elif multirow_comment_flag and (line in ["*/", "-->"] or any(line.endswith(_) for _ in {"*/", "-->"})):
-                multirow_comment_flag = False
-                results.append(False)
-                continue
-            elif multirow_comment_flag:
-                results.append(False)
-                continue
-
-            """跨行script，逆天"""
-            if line == "<<script>>":
-                multirow_script_flag = True
-                results.append(False)
-                continue
-            elif multirow_script_flag and line == "<</script>>":
-                multirow_script_flag = False
-                results.append(False)
-                continue
-            elif multirow_script_flag:
-                results.append(False)
-                continue
-
-            """跨行run，逆天"""
-            if line.startswith("<<run ") and ">>" not in line:
-                multirow_run_flag = True
-                results.append(False)
-                continue
-            elif multirow_run_flag and line in {"})>>", "}>>"}:
-                multirow_run_flag = False
-                results.append(False)
-                continue
-            elif multirow_run_flag:
-                results.append(False)
-                continue
-
-            """跨行if，逆天"""
-            if line.startswith("<<if ") and ">>" not in line:
-                multirow_if_flag = True
-                results.append(False)
-                continue
-            elif multirow_if_flag and ">>" in line:
-                multirow_if_flag = False
-                results.append(False)
-                continue
-            elif multirow_if_flag:
-                results.append(False)
-                continue
-
-            """突如其来的json"""
-            if ((line.startswith("<<set ") or line.startswith("<<error {")) and ">>" not in line) or line.endswith("[") or line.endswith("{") or line.endswith("("):
-                maybe_json_flag = True
-            elif maybe_json_flag and ">>" in line:
-                maybe_json_flag = False
-
-            """就这个特殊"""
-            if line == "<<set _specialClothesHint to {":
-                shop_clothes_hint_flag = True
-                results.append(False)
-                continue
-            elif shop_clothes_hint_flag and line == "}>>":
-                shop_clothes_hint_flag = False
-                results.append(False)
-                continue
-            elif shop_clothes_hint_flag:
-                results.append(True)
-                continue
-
-            if self.is_comment(line) or self.is_event(line) or self.is_only_marks(line):
-                results.append(False)
-            elif (
-                "<" in line and (
-                    self.is_tag_span(line)
-                    or self.is_tag_label(line)
-                    or self.is_tag_input(line)
-                    or self.is_widget_note(line)
-                    or self.is_widget_print(line)
-                    or self.is_widget_option(line)
-                    or (self.is_widget_link(line) and not self.is_widget_high_rate_link(line))
-                    or ("<<set " in line and self.is_widget_set_to(line, {
-                        r"\$_strings", r"\$_text_output", "_text_output",
-                        r"\$_customertype", r"\$_theboy", "_clothesDesc"
-                    }))
-                    or any(re.findall(r"<<set (?:(?:\$|_)[^_][#;\w\.\(\)\[\]\"\'`]*) to \[[\"\'`\w,\s]*\]>>", line))
-                )
-            ):
-                results.append(True)
-            elif ("<" in line and self.is_only_widgets(line)) or (maybe_json_flag and self.is_json_line(line)):
-                results.append(False)
-            else:
-                results.append(True)
-        return results
+        return self._run_rules("normal", lambda: (
+            multirow_comment(),
+            MULTIROW_SCRIPT,
+            MULTIROW_RUN,
+            MULTIROW_IF,
+            MAYBE_JSON,
+            Block(  # 就这个特殊
+                "shop_clothes_hint",
+                enter=lambda line: line == "<<set _specialClothesHint to {",
+                exit=lambda line: line == "}>>",
+                inside=True
+            ),
+            Rule("text_json", result=lambda line: NORMAL_LINE_CLASSIFIER.is_text(line, True), state="maybe_json"),
+            Rule("text", result=NORMAL_LINE_CLASSIFIER.is_text),
+        ))
 
     """ 归整 """
     def parse_type_only(self, pattern: Union[str, Set[str]]) -> List[bool]:
@@ -1426,15 +1013,17 @@ class ParseTextTwee:
     def parse_type_only_regex(self, pattern: Union[str, Set[str]]) -> List[bool]:
         """指文件中只有一种或几种正则格式需要提取"""
         if isinstance(pattern, str):
+            regex = re.compile(pattern)
             return [
                 line.strip() and
-                any(re.findall(pattern, line.strip()))
+                regex.search(line.strip()) is not None
                 for line in self._lines
             ]
 
+        regexes = [re.compile(_) for _ in pattern]
         return [
             line.strip() and
-            any(re.findall(_, line.strip()) for _ in pattern)
+            any(_.search(line.strip()) for _ in regexes)
             for line in self._lines
         ]
 
@@ -1463,42 +1052,33 @@ class ParseTextTwee:
 
     def parse_type_between(self, starts: List[str], ends: List[str], contain: bool = False) -> List[bool]:
         """指文件中只有这两部分之间的内容需要提取"""
-        results = []
-        needed_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            """跨行注释/script，逆天"""
-            if line in starts:
-                needed_flag = True
-                results.append(contain)
-            elif line in ends:
-                needed_flag = False
-                results.append(contain)
-            elif needed_flag:
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules(f"between {starts} {ends} {contain}", lambda: (
+            Block(
+                "between",
+                enter=lambda line: line in starts,
+                exit=lambda line: line in ends,
+                inside=True,
+                enter_result=contain,
+                exit_result=contain,
+                exit_anywhere=True
+            ),
+        ))
 
     """ 判断 """
     @staticmethod
     def is_comment(line: str) -> bool:
         """注释"""
-        return any(line.startswith(_) for _ in {"/*", "<!--", "*/", "*"})
+        return line.startswith(COMMENT_PREFIXES)  # "*/" 也是 "*" 开头
 
     @staticmethod
     def is_json_line(line: str) -> bool:
         """ xxx: yyy """
-        return any(re.findall(r"^[\w\"]*\s*:\s*[ \'/\$\.\w\":,\|\(\)\{\}\[\]]+,*$", line))
+        return PREDICATE_PATTERNS["json_line"].search(line) is not None
 
     @staticmethod
     def is_only_marks(line: str) -> bool:
         """只有符号没字母数字"""
-        return not any(re.findall(r"([A-Za-z\d]+)", line))
+        return PREDICATE_PATTERNS["alnum"].search(line) is None
 
     @staticmethod
     def is_event(line: str) -> bool:
@@ -1508,63 +1088,62 @@ class ParseTextTwee:
     @staticmethod
     def is_tag_span(line: str) -> bool:
         """<span???>xxx"""
-        return any(re.findall(r'<span.*?>[\"\w\.]', line))
+        return PREDICATE_PATTERNS["tag_span"].search(line) is not None
 
     @staticmethod
     def is_tag_label(line: str) -> bool:
         """<label>xxx</label>"""
-        return any(re.findall(r"<label>\w", line)) or any(re.findall(r"\w</label>", line))
+        return PREDICATE_PATTERNS["tag_label"].search(line) is not None
 
     @staticmethod
     def is_tag_input(line: str) -> bool:
         """<input """
-        return any(re.findall(r"<input.*?value=\"", line))
+        return PREDICATE_PATTERNS["tag_input"].search(line) is not None
 
     @staticmethod
     def is_widget_script(line: str) -> bool:
         """<<script """
-        return any(re.findall(r"<<script", line))
+        return "<<script" in line
 
     @staticmethod
     def is_widget_note(line: str) -> bool:
         """<note """
-        return any(re.findall(r"<<note\s\"", line))
+        return PREDICATE_PATTERNS["widget_note"].search(line) is not None
 
     @staticmethod
     def is_widget_set_to(line: str, keys: Set[str]) -> bool:
         """<<set xxx yyy>>"""
-        pattern = re.compile("<<set\s(?:" + r"|".join(keys) + ")[\'\"\w\s\[\]\$\+\.\(\)\{\}:\-]*(?:to|\+|\+=|\().*?[\w\{\"\'`]+(?:\w| \w|<<|\"\w)")
-        return any(re.findall(pattern, line))
+        return widget_set_to_pattern(keys).search(line) is not None
 
     @staticmethod
     def is_widget_print(line: str) -> bool:
         """<<print xxx>>"""
-        return any(re.findall(r"<<print\s[^<]*[\"\'`\w]+[\?\s\w\.\$,\'\"<>\[\]\(\)/]+(?:\)>>|\">>|\'>>|`>>|\]>>)", line))
+        return WIDGET_PRINT_MATCHER.search(line)
 
     @staticmethod
     def is_widget_if(line: str) -> bool:
         """<<if>>xxx</if>"""
-        return any(re.findall(r"<<if\s.*?>>\w", line))
+        return PREDICATE_PATTERNS["widget_if"].search(line) is not None
 
     @staticmethod
     def is_widget_option(line: str) -> bool:
         """<<option """
-        return any(re.findall(r"<<option\s\"", line))
+        return PREDICATE_PATTERNS["widget_option"].search(line) is not None
 
     @staticmethod
     def is_widget_button(line: str) -> bool:
         """<<option """
-        return any(re.findall(r"<<button ", line))
+        return "<<button " in line
 
     @staticmethod
     def is_widget_link(line: str) -> bool:
         """<<link [[xxx|yyy]]>>, <<link "xxx">> """
-        return any(re.findall(r"<<link\s*(\[\[|\"\w)", line))
+        return PREDICATE_PATTERNS["widget_link"].search(line) is not None
 
     @staticmethod
     def is_widget_high_rate_link(line: str) -> bool:
         """高频选项"""
-        return any(re.findall(r"<<link \[\[(Next\||Next\s\||Leave\||Refuse\||Return\||Resume\||Confirm\||Continue\||Stop\|)", line))
+        return HIGH_RATE_LINK_MATCHER.search(line)
 
     @staticmethod
     def is_widget_actions_tentacle(line: str) -> bool:
@@ -1576,32 +1155,219 @@ class ParseTextTwee:
         """整行只有 <<>>, <>, $VAR"""
         if "<" not in line and "$" not in line and not line.startswith("_"):
             return False
+        return ParseTextTwee._only_widgets_scan(line)
+
+    @staticmethod
+    def _only_widgets_scan(line: str) -> bool:
+        """
+        和 _only_widgets_slow 结果一样，但是不删字符串，只记下标:
+        剩下的部分是原行里的若干段 [start, end)，<<>> 删掉后 <> 和 $VAR 可能跨过删掉的地方，所以按段往下走
+        """
+        if line in ONLY_WIDGETS_HALVES:
+            return True
+        """
+        开头一串完整的 <<>> / <> 和空白一定正好删光，后面第一个字要是不是 < / $ _，它和到下一个 < $ _ 之前的东西就一定留得下:
+        是 * 就是注释，不是 / 又有字母数字就不可能全删光
+        """
+        patterns = PREDICATE_PATTERNS
+        pos = patterns["only_widgets_markup"].match(line).end()
+        if pos == len(line):
+            return True
+        head = line[pos]
+        if head == "*":
+            return True
+        if head not in "</$_":
+            following = patterns["only_widgets_first"].search(line, pos)
+            if patterns["alnum"].search(line, pos, following.start() if following else len(line)) is not None:
+                return False
+
+        if "<<" in line:
+            segments: List[Tuple[int, int]] = []
+            pos = 0
+            for match in patterns["only_widgets_widget"].finditer(line):
+                if match.start() > pos:
+                    segments.append((pos, match.start()))
+                pos = match.end()
+            if pos < len(line):
+                segments.append((pos, len(line)))
+            if not segments:
+                return True
+        else:
+            segments = [(0, len(line))]
+
+        """<> 得有 < 还得在后面有 >"""
+        first_tag = ParseTextTwee._segments_find(line, segments, "<")
+        if 0 <= first_tag < line.rfind(">", 0, segments[-1][1]):
+            segments = ParseTextTwee._cut_segments(segments, ParseTextTwee._scan_tags(line, segments))
+            if not segments:
+                return True
+
+        if line[segments[0][0]] != "_" and ParseTextTwee._segments_find(line, segments, "$") < 0:
+            return ParseTextTwee._only_widgets_rest(line, segments)
+        segments = ParseTextTwee._cut_segments(segments, ParseTextTwee._scan_vars(line, segments))
+        return ParseTextTwee._only_widgets_rest(line, segments)
+
+    @staticmethod
+    def _segments_find(line: str, segments: List[Tuple[int, int]], char: str) -> int:
+        """剩下的部分里第一个 char 在原行的下标，没有是 -1"""
+        for start, end in segments:
+            pos = line.find(char, start, end)
+            if pos >= 0:
+                return pos
+        return -1
+
+    @staticmethod
+    def _scan_tags(line: str, segments: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """剩下的段里的 <...>，和 only_widgets_tag 一样: < 后面一串允许的字符再跟 >；只有一段时直接用 only_widgets_tag"""
+        if len(segments) == 1:
+            return [match.span() for match in PREDICATE_PATTERNS["only_widgets_tag"].finditer(line, *segments[0])]
+        body = PREDICATE_PATTERNS["only_widgets_tag_body"]
+        spans = []
+        idx, pos = 0, segments[0][0]
+        while idx < len(segments):
+            start = line.find("<", pos, segments[idx][1])
+            if start < 0:
+                idx += 1
+                pos = segments[idx][0] if idx < len(segments) else 0
+                continue
+            idx, pos = ParseTextTwee._skip_body(line, segments, idx, start + 1, body)
+            if idx == len(segments):
+                break  # 一直到行尾都是允许的字符，后面不会再有 <
+            if line[pos] == ">":
+                spans.append((start, pos + 1))
+                pos += 1
+        return spans
 
+    @staticmethod
+    def _scan_vars(line: str, segments: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """剩下的段里的 $VAR / _VAR，和 only_widgets_var 一样: $ 或 _ 后面一个不是 _ 的字符再跟一串允许的字符；只有一段时直接用 only_widgets_var"""
+        if len(segments) == 1:
+            return [match.span() for match in PREDICATE_PATTERNS["only_widgets_var"].finditer(line, *segments[0])]
+        opener, body = PREDICATE_PATTERNS["only_widgets_opener"], PREDICATE_PATTERNS["only_widgets_var_body"]
+        spans = []
+        idx, pos = 0, segments[0][0]
+        while idx < len(segments):
+            match = opener.search(line, pos, segments[idx][1])
+            if match is None:
+                idx += 1
+                pos = segments[idx][0] if idx < len(segments) else 0
+                continue
+            start = match.start()
+            next_idx, next_pos = idx, start + 1
+            if next_pos == segments[idx][1]:
+                next_idx += 1
+                if next_idx == len(segments):
+                    break  # 行尾单独一个 $ / _
+                next_pos = segments[next_idx][0]
+            if line[next_pos] == "_":
+                idx, pos = next_idx, next_pos  # 这个 _ 自己再当开头试一次
+                continue
+            idx, pos = ParseTextTwee._skip_body(line, segments, next_idx, next_pos + 1, body)
+            spans.append((start, pos))
+        return spans
+
+    @staticmethod
+    def _skip_body(line: str, segments: List[Tuple[int, int]], idx: int, pos: int, body: Pattern) -> Tuple[int, int]:
+        """从第 idx 段的 pos 开始跳过 body 允许的字符，可以跨段；到行尾时段号是 len(segments)"""
+        while True:
+            end = segments[idx][1]
+            pos = body.match(line, pos, end).end()
+            if pos < end:
+                return idx, pos
+            idx += 1
+            if idx == len(segments):
+                return idx, pos
+            pos = segments[idx][0]
+
+    @staticmethod
+    def _cut_segments(segments: List[Tuple[int, int]], spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """从段里去掉 spans (按原行下标，从小到大不重叠)"""
+        if not spans:
+            return segments
+        result = []
+        span_idx = 0
+        for start, end in segments:
+            while span_idx < len(spans) and spans[span_idx][1] <= start:
+                span_idx += 1
+            idx = span_idx
+            while idx < len(spans) and spans[idx][0] < end:
+                if spans[idx][0] > start:
+                    result.append((start, spans[idx][0]))
+                start = max(start, spans[idx][1])
+                idx += 1
+            if start < end:
+                result.append((start, end))
+        return result
+
+    @staticmethod
+    def _only_widgets_rest(line: str, segments: List[Tuple[int, int]]) -> bool:
+        """剩下的是空白、注释或者只有符号，和 _only_widgets_slow 最后的判断一样"""
+        alnum = PREDICATE_PATTERNS["alnum"]
+        for start, end in segments:
+            if alnum.search(line, start, end) is not None:
+                break
+        else:
+            return True  # 也包括全是空白
+
+        non_space = PREDICATE_PATTERNS["non_space"]
+        for idx, (start, end) in enumerate(segments):
+            match = non_space.search(line, start, end)
+            if match is None:
+                continue
+            if line.startswith(COMMENT_PREFIXES, match.start(), end):
+                return True
+            if end - match.start() >= 4 or idx == len(segments) - 1:
+                return False
+            return any(ParseTextTwee._segments_startswith(line, segments, idx, match.start(), prefix) for prefix in COMMENT_PREFIXES)
+        return True
+
+    @staticmethod
+    def _segments_startswith(line: str, segments: List[Tuple[int, int]], idx: int, pos: int, prefix: str) -> bool:
+        """剩下的部分从第 idx 段的 pos 开始是不是以 prefix 开头，可以跨段"""
+        for char in prefix:
+            if pos == segments[idx][1]:
+                idx += 1
+                if idx == len(segments):
+                    return False
+                pos = segments[idx][0]
+            if line[pos] != char:
+                return False
+            pos += 1
+        return True
+
+    @staticmethod
+    def _only_widgets_slow(line: str) -> bool:
+        """原来的做法: 依次删掉 <<>>, <>, $VAR 再看剩下的；不在判断里用，只拿来核对 _only_widgets_scan"""
         """特殊的半拉"""
-        if line in {"<<print either(", "<<print ["}:
+        if line in ONLY_WIDGETS_HALVES:
             return True
 
-        widgets = {_ for _ in re.findall(r"(<<(?:[^<>]*?|for.*?)>>)", line) if _}
+        widgets = {_ for _ in PREDICATE_PATTERNS["only_widgets_widget"].findall(line) if _}
         for w in widgets:
             # if "[[" not in w or ("[" in w and '"' not in w and "'" not in w and "`" not in w):
             line = line.replace(w, "", -1)
 
         if "<" not in line and "$" not in line and not line.startswith("_"):
             return (not line.strip()) or ParseTextTwee.is_comment(line.strip()) or ParseTextTwee.is_only_marks(line.strip()) or False
-        tags = {_ for _ in re.findall(r"(<[/\s\w\"=\-@\$\+\'\.]*>)", line) if _}
+        tags = {_ for _ in PREDICATE_PATTERNS["only_widgets_tag"].findall(line) if _}
         for t in tags:
             line = line.replace(t, "", -1)
 
         if "$" not in line and not line.startswith("_"):
             return (not line.strip()) or ParseTextTwee.is_comment(line.strip()) or ParseTextTwee.is_only_marks(line.strip()) or False
 
-        vars_ = {_ for _ in re.findall(r"((?:\$|_)[^_][#;\w\.\(\)\[\]\"\'`]*)", line) if _}
+        vars_ = {_ for _ in PREDICATE_PATTERNS["only_widgets_var"].findall(line) if _}
         for v in vars_:
             line = line.replace(v, "", -1)
         return (not line.strip()) or ParseTextTwee.is_comment(line.strip()) or ParseTextTwee.is_only_marks(line.strip()) or False
 
 
+NORMAL_LINE_CLASSIFIER = NormalLineClassifier()
+
+
 class ParseTextJS:
+    """编译好的规则表，name -> LineRules"""
+    _RULES: Dict[str, LineRules] = {}
 
     def __init__(self, lines: List[str], filepath: Path):
         self._lines = lines
@@ -1610,6 +1376,13 @@ class ParseTextJS:
         self._filename = self._filepath.name  # 文件名
         self._filedir = self._filepath.parent  # 文件夹
 
+    def _run_rules(self, name: str, build: Callable[[], Sequence[Union[Block, Rule]]], default: bool = False) -> List[bool]:
+        """规则表第一次用到时才建、才编译，之后同一个类里按 name 复用"""
+        rules = self._RULES.get(name)
+        if rules is None:
+            rules = self._RULES[name] = LineRules(name, build(), default)
+        return rules.run(self._lines)
+
     def parse(self) -> List[bool]:
         """"""
         if DirNamesJS.JAVASCRIPT.value == self._filedir.name:
@@ -1643,72 +1416,42 @@ class ParseTextJS:
 
     def _parse_bedroom_pills(self):
         """..."""
-        results = []
-        next_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if any(_ in line for _ in {"name:", "description:", "onTakeMessage:", "warning_label:"}) and not line.startswith("*"):
-                if line.endswith(":"):
-                    next_flag = True
-                    results.append(False)
-                else:
-                    results.append(True)
-                continue
-            elif next_flag:
-                next_flag = False
-                results.append(True)
-                continue
-
-            if (any(_ in line for _ in {
+        is_key = lambda line: (
+            any(_ in line for _ in {"name:", "description:", "onTakeMessage:", "warning_label:"})
+            and not line.startswith("*")
+        )
+        return self._run_rules("js.bedroom_pills", lambda: (
+            Rule("value", lambda line: is_key(line) and not line.endswith(":")),
+            Block(  # 冒号结尾的，值在下一行
+                "next",
+                enter=lambda line: is_key(line) and line.endswith(":"),
+                exit=lambda line: True,
+                exit_result=True
+            ),
+            Rule("text", lambda line: any(_ in line for _ in {
                 '<span class="hpi_auto_label">',
                 'class="hpi_take_pills"',
                 "item.autoTake() ?",
                 "item.hpi_take_pills ?"
-            })):
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+            })),
+        ))
 
     def _parse_debug_menu(self):
         """..."""
-        results = []
-        inner_html_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if 'document.getElementById("debugEventsAdd").innerHTML' in line:
-                inner_html_flag = True
-                results.append(False)
-                continue
-            elif inner_html_flag and line == "`;":
-                inner_html_flag = False
-                results.append(False)
-                continue
-            elif inner_html_flag:
-                if any(_ in line for _ in {
-                    "<abbr>", "<span>", "<option", "<button",
-                    "<h3>"
-                }):
-                    results.append(True)
-                    continue
-                results.append(False)
-                continue
-
-            if any(_ in line for _ in {"link: [`", 'link: ["', "link: [(", "text_only: "}):
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+        return self._run_rules("js.debug_menu", lambda: (
+            Block(
+                "inner_html",
+                enter=lambda line: 'document.getElementById("debugEventsAdd").innerHTML' in line,
+                exit=lambda line: line == "`;",
+                inside=None
+            ),
+            Rule("inner_html_text", lambda line: any(_ in line for _ in {
+                "<abbr>", "<span>", "<option", "<button",
+                "<h3>"
+            }), state="inner_html"),
+            Rule("inner_html", result=False, state="inner_html"),
+            Rule("text", lambda line: any(_ in line for _ in {"link: [`", 'link: ["', "link: [(", "text_only: "})),
+        ))
 
     def _parse_eyes_related(self):
         """怪东西"""
@@ -1720,123 +1463,57 @@ class ParseTextJS:
 
     def _parse_sexshop_menu(self):
         """json"""
-        results = []
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if any(_ in line for _ in {
-                "namecap: ", "description: ", "${item.owned()"
-            }) or ("Buy it" in line and "/*" not in line) or "Make a gift for :" in line:
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+        return self._run_rules("js.sexshop_menu", lambda: (
+            Rule("text", lambda line: (
+                any(_ in line for _ in {"namecap: ", "description: ", "${item.owned()"})
+                or ("Buy it" in line and "/*" not in line)
+                or "Make a gift for :" in line
+            )),
+        ))
 
     def _parse_sextoy_inventory(self):
         """零碎东西"""
-        results = []
-        a_flag = False
-        cursed_flag = False
-        carry_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if "<a id=" in line:
-                a_flag = True
-                results.append(False)
-                continue
-            elif a_flag and line == "</a>":
-                a_flag = False
-                results.append(False)
-                continue
-            elif a_flag:
-                results.append(True)
-                continue
-
-            if line == 'document.getElementById("stiCursedText").outerHTML =':
-                cursed_flag = True
-                results.append(False)
-                continue
-            elif cursed_flag and line == "return;":
-                cursed_flag = False
-                results.append(False)
-                continue
-            elif cursed_flag:
-                results.append(True)
-                continue
-
-            if 'document.getElementById("carryCount")' in line:
-                carry_flag = False
-                results.append(False)
-                continue
-            elif carry_flag and line == "</div>`;":
-                carry_flag = False
-                results.append(False)
-                continue
-            elif carry_flag:
-                results.append(True)
-                continue
-
-            if ".textContent" in line or "(elem !== null)" in line:
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("js.sextoy_inventory", lambda: (
+            Block(
+                "a",
+                enter=lambda line: "<a id=" in line,
+                exit=lambda line: line == "</a>",
+                inside=True
+            ),
+            Block(
+                "cursed",
+                enter=lambda line: line == 'document.getElementById("stiCursedText").outerHTML =',
+                exit=lambda line: line == "return;",
+                inside=True
+            ),
+            Rule("carry_count", lambda line: 'document.getElementById("carryCount")' in line, False),  # 原来这里的 flag 从没置成 True 过
+            Rule("text", lambda line: ".textContent" in line or "(elem !== null)" in line),
+        ))
 
     def _parse_idb_backend(self):
         """lastChild.innerText"""
-        results = []
-        inner_text_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if "lastChild.innerText" in line and not line.endswith(";"):
-                inner_text_flag = True
-                results.append(False)
-            elif inner_text_flag and line.endswith(';'):
-                inner_text_flag = False
-                results.append(False)
-            elif inner_text_flag or "lastChild.innerText" in line:
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+        return self._run_rules("js.idb_backend", lambda: (
+            Block(
+                "inner_text",
+                enter=lambda line: "lastChild.innerText" in line and not line.endswith(";"),
+                exit=lambda line: line.endswith(";"),
+                inside=True
+            ),
+            Rule("text", lambda line: "lastChild.innerText" in line),
+        ))
 
     def _parse_ui(self):
         """text"""
-        results = []
-        text_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if line == "text =":
-                text_flag = True
-                results.append(False)
-            elif text_flag and line == "break;":
-                text_flag = False
-                results.append(False)
-            elif text_flag and not self.is_only_marks(line):
-                results.append(True)
-            elif "text =" in line and "let text" not in line and "const text" not in line:
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+        return self._run_rules("js.ui", lambda: (
+            Block(
+                "text",
+                enter=lambda line: line == "text =",
+                exit=lambda line: line == "break;",
+                inside=None
+            ),
+            Rule("text_inside", lambda line: not ParseTextJS.is_only_marks(line), state="text"),
+            Rule("text", lambda line: "text =" in line and "let text" not in line and "const text" not in line),
+        ))
 
     """ 04-variables """
     def parse_variables(self) -> List[bool]:
@@ -1864,66 +1541,36 @@ class ParseTextJS:
 
     def _parse_actions(self):
         """result.text"""
-        results = []
-        maybe_json_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if line.endswith("{"):
-                maybe_json_flag = True
-                results.append(False)
-                continue
-            elif maybe_json_flag and any(line.endswith(_) for _ in {"};", ")};"}):
-                maybe_json_flag = False
-                results.append(False)
-                continue
-            elif maybe_json_flag and self.is_json_line(line) and "text:" in line:
-                results.append(True)
-                continue
-
-            if any(_ in line for _ in {"result.text", }):
-                results.append(True)
-            else:
-                results.append(False)
-        return results
+        return self._run_rules("js.actions", lambda: (
+            Block(
+                "maybe_json",
+                enter=lambda line: line.endswith("{"),
+                exit=lambda line: line.endswith(("};", ")};")),
+                inside=None
+            ),
+            Rule("json_text", lambda line: ParseTextJS.is_json_line(line) and "text:" in line, state="maybe_json"),
+            Rule("text", lambda line: "result.text" in line),
+        ))
 
     """ 常规 """
     def parse_normal(self) -> List[bool]:
         """常规"""
-        results = []
-        append_fragment_flag = False
-        for line in self._lines:
-            line = line.strip()
-            if not line:
-                results.append(False)
-                continue
-
-            if line == "fragment.append(":
-                append_fragment_flag = True
-                results.append(False)
-            elif append_fragment_flag and line == ");":
-                append_fragment_flag = False
-                results.append(False)
-            elif (
-                append_fragment_flag
-                and not self.is_only_marks(line)
-                and line not in {
-                    "Wikifier.wikifyEval(", "span(", "altText.selectedToy"
-                }
-            ):
-                results.append(True)
-            elif "fragment.append(" in line and any(
+        return self._run_rules("js.normal", lambda: (
+            Block(
+                "append_fragment",
+                enter=lambda line: line == "fragment.append(",
+                exit=lambda line: line == ");",
+                inside=None
+            ),
+            Rule("fragment_text", lambda line: (
+                not ParseTextJS.is_only_marks(line)
+                and line not in {"Wikifier.wikifyEval(", "span(", "altText.selectedToy"}
+            ), state="append_fragment"),
+            Rule("text", lambda line: "fragment.append(" in line and any(
                 _ not in line
                 for _ in {"''", "' '", '""', '" "', "``", "` `", "br()"}
-            ):
-                results.append(True)
-            else:
-                results.append(False)
-
-        return results
+            )),
+        ))
 
     """ 归整 """
     def parse_type_only(self, pattern: Union[str, Set[str]]) -> List[bool]:
@@ -1957,6 +1604,14 @@ class ParseTextJS:
 
 
 __all__ = [
+    "HighRateLinkMatcher",
+    "HIGH_RATE_LINK_MATCHER",
+    "PREDICATE_PATTERNS",
+    "WidgetPrintMatcher",
+    "WIDGET_PRINT_MATCHER",
+    "widget_set_to_pattern",
+    "NormalLineClassifier",
+    "NORMAL_LINE_CLASSIFIER",
     "ParseTextTwee",
     "ParseTextJS"
 ]
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+.twee 按段落 (:: 开头的行) 切开，每段的提取结果按 (段落内容, 选规则的依据, 进段时各规则表的状态, 提取规则版本 parser_code_version) 存下来，
+游戏换版本时没改过的段落直接拿结果，只有改过的段落才跑 ParseTextTwee
+"""
+import hashlib
+import json
+import os
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .consts import *
+from .extract_cache import parser_code_version
+from .line_rules import States
+from .log import logger
+from .parse_text import ParseTextTwee
+
+
+class PassageCache:
+    """段落级提取缓存，每个进程一个，用到的条目 take 出来交给主进程汇总后 save"""
+
+    def __init__(self, cache_file: Path = FILE_PASSAGE_CACHE):
+        self._cache_file = cache_file
+        self._entries: Dict[str, dict] = self._load(cache_file)
+        self._used: Dict[str, dict] = {}  # 上次 take 以来用到的
+        self.reused = 0
+        self.parsed = 0
+
+    @staticmethod
+    def _load(cache_file: Path) -> Dict[str, dict]:
+        """key: {lines: "0101...", exit: {规则表: [状态]}}"""
+        if not cache_file.exists():
+            return {}
+        try:
+            with open(cache_file, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            logger.warning("\t!!! 段落缓存损坏，全部重新解析")
+            return {}
+
+    @staticmethod
+    def save(entries: Dict[str, dict], cache_file: Path = FILE_PASSAGE_CACHE):
+        """只存这次用到的"""
+        os.makedirs(cache_file.parent, exist_ok=True)
+        temp_file = cache_file.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as fp:
+            json.dump(entries, fp, separators=(",", ":"))
+        os.replace(temp_file, cache_file)
+
+    def take(self) -> Tuple[Dict[str, dict], int, int]:
+        """交出上次 take 以来用到的条目、复用段数、解析段数并清零，子进程里每个文件交一次"""
+        used, reused, parsed = self._used, self.reused, self.parsed
+        self._entries.update(used)
+        self._used, self.reused, self.parsed = {}, 0, 0
+        return used, reused, parsed
+
+    @staticmethod
+    def split_passages(lines: List[str]) -> List[List[str]]:
+        """第一个段落头之前的算一段，之后每个 :: 开头的行起一段"""
+        passages, start = [], 0
+        for idx, line in enumerate(lines):
+            if idx > start and line.startswith("::"):
+                passages.append(lines[start:idx])
+                start = idx
+        if start < len(lines):
+            passages.append(lines[start:])
+        return passages
+
+    @staticmethod
+    def passage_key(dispatch_key: tuple, states: Dict[str, States], lines: List[str]) -> str:
+        digest = hashlib.sha256("".join(lines).encode("utf-8")).hexdigest()
+        context = json.dumps([parser_code_version(), dispatch_key, sorted(states.items())])
+        return hashlib.sha256(f"{context}\n{digest}".encode("utf-8")).hexdigest()
+
+    def parse(self, lines: List[str], filepath: Path) -> List[bool]:
+        """
+        和 ParseTextTwee(lines, filepath).parse() 结果一样:
+        一段一段接着跑，上一段结束时的状态就是下一段进来时的状态，也算进 key 里
+        """
+        dispatch_key = ParseTextTwee([], filepath).dispatch_key
+        states: Dict[str, States] = {}
+        able_lines = []
+        for passage in self.split_passages(lines):
+            key = self.passage_key(dispatch_key, states, passage)
+            entry = self._used.get(key) or self._entries.get(key)
+            if entry is None:
+                pt = ParseTextTwee(passage, filepath, states)
+                entry = {
+                    "lines": "".join("1" if _ else "0" for _ in pt.parse()),
+                    "exit": {name: list(state) for name, state in pt.exit_states.items()},
+                }
+                self.parsed += 1
+            else:
+                self.reused += 1
+            self._used[key] = entry
+            able_lines.extend(_ == "1" for _ in entry["lines"])
+            states = {name: tuple(state) for name, state in entry["exit"].items()}
+        return able_lines
+
+    def retain(self, lines: List[str], filepath: Path):
+        """
+        整文件缓存命中时不解析，但这个文件的段落条目还得留着 (下个版本文件改了还要用)；
+        按一样的方式算 key，接不上 (缓存里没有) 就停
+        """
+        dispatch_key = ParseTextTwee([], filepath).dispatch_key
+        states: Dict[str, States] = {}
+        for passage in self.split_passages(lines):
+            key = self.passage_key(dispatch_key, states, passage)
+            entry = self._used.get(key) or self._entries.get(key)
+            if entry is None:
+                return
+            self._used[key] = entry
+            states = {name: tuple(state) for name, state in entry["exit"].items()}
+
+
+__all__ = [
+    "PassageCache"
+]
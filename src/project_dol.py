@@ -1,12 +1,19 @@
 import csv
 import re
 
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
-from zipfile import ZipFile
-from urllib.parse import quote
+from re import Pattern
+from typing import AsyncIterator, Callable, List, Dict, Deque, Iterator, Optional, Tuple
+from zipfile import BadZipFile, ZipFile, ZipInfo
 
 import asyncio
+import difflib
+import hashlib
+import inspect
+import io
 import json
 import httpx
 import os
@@ -16,13 +23,93 @@ import time
 import webbrowser
 
 from .consts import *
+from .lint import LINT_RULES, Linter
 from .log import logger
+from .extract_cache import ExtractCache
 from .parse_text import *
+from .passage_cache import PassageCache
 from .utils import *
 
 
+@dataclass(frozen=True)
+class SourceFixup:
+    """覆写时对源码的逐行修正"""
+    group: str  # 同组规则只用第一条命中的
+    marker: str  # 行里得有这个才往下判断
+    replaces: Tuple[Tuple[str, str], ...] = ()  # 命中后依次替换
+    pattern: Optional[Pattern] = None  # 还得满足的正则
+    subn: Optional[Callable[[str], Tuple[str, int]]] = None  # 自己找自己换，换了 0 处就算没命中
+    whole_line: bool = False  # 整行去掉首尾空白后就是 marker，整行换掉
+    final: bool = False  # 命中后这行不再看别的规则
+
+    def apply(self, line: str) -> Optional[str]:
+        """没命中返回 None"""
+        if self.whole_line:
+            return self.replaces[0][1] if line.strip() == self.marker else None
+        if self.marker not in line:
+            return None
+        if self.subn is not None:
+            line, count = self.subn(line)
+            return line if count else None
+        if self.pattern is not None and self.pattern.search(line) is None:
+            return None
+        for old, new in self.replaces:
+            line = line.replace(old, new)
+        return line
+
+
+SOURCE_FIXUPS: Tuple[SourceFixup, ...] = (
+    # 正则放宽到中文
+    SourceFixup("regex", "replace(/[^a-zA-Z 0-9.!()]", (("replace(/[^a-zA-Z 0-9.!()]", "replace(/[^a-zA-Z\\u4e00-\\u9fa5 0-9.!()]"),), final=True),
+    # 怪东西
+    SourceFixup("regex", "].select($_rng)>>", (("].select($_rng)>>", ""),), whole_line=True, final=True),
+    # 高频词，见 consts.HIGH_RATE_LINKS
+    SourceFixup("link", "<<link [[", subn=HIGH_RATE_LINK_MATCHER.subn),
+    SourceFixup("link", "<<print", (("writing>>", "writ_cn>>"),), re.compile(r"<<print.*?\.writing>>")),
+    SourceFixup("name_cap", "<<link ", (("name_cap>>", "cn_name_cap>>"),), re.compile(r"<<link.*?\.name_cap>>")),
+    SourceFixup("name_cap", "<<clothingicon", (("name_cap", "cn_name_cap"),), re.compile(r"<<clothingicon.*?\.name_cap")),
+)
+
+"""整行换掉的行不能先被词条翻译掉，不然修正就对不上了"""
+WHOLE_LINE_FIXUP_MARKERS = frozenset(fixup.marker for fixup in SOURCE_FIXUPS if fixup.whole_line)
+
+
+@dataclass(frozen=True)
+class ApplyOptions:
+    """覆写选项，要传给子进程"""
+    by_lineno: bool = False
+    window: int = 64
+    cache_dir: Optional[Path] = None  # None 就是不做增量
+    rules: str = ""  # 覆写规则的 hash
+    game_dir: Optional[Path] = None  # patch 里的路径相对它
+    patch_format: Optional[str] = None  # 不为 None 就是试运行: diff / json
+
+
+@dataclass
+class ApplyResult:
+    """一个文件的覆写结果"""
+    stats: Counter
+    logs: List[Tuple[str, str]]  # (日志等级, 日志)
+    entry: Optional[dict]  # 增量清单里这个文件的新条目
+    action: str  # applied / restored / skipped / stale (缓存里的原文没了，没覆写)
+    patch: str = ""  # 试运行时的改动
+
+
+@dataclass
+class ExtractResult:
+    """一个文件的提取结果，csv 在子进程里直接写了，只带回日志和段落缓存"""
+    logs: List[Tuple[str, str]]  # (日志等级, 日志)
+    passages: Dict[str, dict]  # 这个文件用到的段落缓存条目
+    reused: int = 0
+    parsed: int = 0
+    file_key: str = ""  # 整文件缓存的 key
+    file_entry: Optional[bytes] = None  # 整文件缓存没命中时新算的有效行，命中时是 None
+
+
 class ProjectDOL:
     """本地化主类"""
+    _worker_passage_cache: Optional[PassageCache] = None  # 提取子进程里各自加载一份
+    _worker_extract_cache: Optional[ExtractCache] = None
 
     def __init__(self, type_: str = "common"):
         with open(DIR_DATA_ROOT / "blacklists.json", "r", encoding="utf-8") as fp:
@@ -52,52 +139,189 @@ class ProjectDOL:
         self._init_dirs(self._version)
 
     """生成字典"""
-    async def download_from_gitgud(self):
-        """从 gitgud 下载源仓库文件"""
+    async def download_from_gitgud(self) -> bool:
+        """
+        从 gitgud 下载源仓库文件
+        :return: 下载失败没有可用的压缩包时为 False，这时不解压
+        """
         if not self._version:
             await self.fetch_latest_version()
-        await self.fetch_latest_repository()
+        if await self.fetch_latest_repository() is None:
+            return False
         await self.unzip_latest_repository()
+        return True
 
-    async def fetch_latest_repository(self):
-        """获取最新仓库内容"""
+    async def fetch_latest_repository(self, zip_url: str = None) -> Optional[bool]:
+        """
+        获取最新仓库内容，先带着上次的 ETag / Last-Modified 问一下，本地的压缩包还是最新的就不下载
+        :param zip_url: 默认按 type_ 选 gitgud 上的压缩包，换成别的地址 (比如本地起的服务) 也行
+        :return: True 重新下载了，False 本地的压缩包还是最新的，None 下载失败 (本地没有可用的压缩包)
+        """
         logger.info("===== 开始获取最新仓库内容 ...")
+        zip_url = zip_url or (REPOSITORY_ZIP_URL_COMMON if self._type == "common" else REPOSITORY_ZIP_URL_DEV)
+        cached = self._load_repository_meta(zip_url)
         async with httpx.AsyncClient() as client:
-            zip_url = REPOSITORY_ZIP_URL_COMMON if self._type == "common" else REPOSITORY_ZIP_URL_DEV
-            flag = False
+            response = None
             for _ in range(3):
                 try:
-                    response = await client.head(zip_url, timeout=60, follow_redirects=True)
-                    filesize = int(response.headers["Content-Length"])
-                    chunks = await chunk_split(filesize, 64)
-                except (httpx.ConnectError, KeyError) as e:
+                    response = await client.head(zip_url, headers=self._conditional_headers(cached), timeout=60, follow_redirects=True)
+                except httpx.ConnectError:
                     continue
                 else:
-                    flag = True
                     break
 
-            if not flag:
+            if response is None:
                 logger.error("***** 无法正常下载最新仓库源码！请检查你的网络连接是否正常！")
-            tasks = [
-                chunk_download(zip_url, client, start, end, idx, len(chunks), FILE_REPOSITORY_ZIP)
-                for idx, (start, end) in enumerate(chunks)
-            ]
-            await asyncio.gather(*tasks)
+                return None
+            if response.status_code not in {200, 304}:
+                logger.error(f"***** 无法正常下载最新仓库源码！服务器返回 {response.status_code}！")
+                return None
+            if self._repository_unchanged(cached, response):
+                logger.info("\t- 本地压缩包已是最新, 跳过下载")
+                logger.info("##### 最新仓库内容已获取! \n")
+                return False
+            try:
+                filesize = int(response.headers["Content-Length"])
+            except KeyError:
+                logger.error("***** 无法正常下载最新仓库源码！服务器没有返回文件大小！")
+                return None
+
+            """下到一半断了也不会留下对不上的记录，没下完的片记在 .parts 里，下次接着下"""
+            FILE_REPOSITORY_META.unlink(missing_ok=True)
+            os.makedirs(DIR_REPOSITORY_CACHE, exist_ok=True)
+            if not await download_in_chunks(zip_url, client, FILE_REPOSITORY_ZIP, filesize, self._range_validator(response)):
+                return None
+        if not self._repository_intact():
+            FILE_REPOSITORY_ZIP.unlink(missing_ok=True)
+            logger.error("***** 下载的仓库压缩包已损坏，下次运行会重新下载！")
+            return None
+        self._save_repository_meta(zip_url, response)
         logger.info("##### 最新仓库内容已获取! \n")
+        return True
+
+    @staticmethod
+    def _load_repository_meta(zip_url: str) -> Optional[dict]:
+        """上次下载的 {url, etag, last_modified, content_length}，地址不一样或者压缩包不完整就当没有"""
+        try:
+            with open(FILE_REPOSITORY_META, "r", encoding="utf-8") as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != zip_url or not FILE_REPOSITORY_ZIP.exists():
+            return None
+        if FILE_REPOSITORY_ZIP.stat().st_size != meta.get("content_length"):
+            return None
+        return meta
+
+    @staticmethod
+    def _save_repository_meta(zip_url: str, response: httpx.Response):
+        meta = {
+            "url": zip_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_length": int(response.headers["Content-Length"]),
+        }
+        with open(FILE_REPOSITORY_META, "w", encoding="utf-8") as fp:
+            json.dump(meta, fp, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _range_validator(response: httpx.Response) -> Optional[str]:
+        """If-Range 只认强 ETag 和 Last-Modified"""
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return response.headers.get("Last-Modified")
 
     @staticmethod
-    async def unzip_latest_repository():
-        """解压到本地"""
+    def _repository_intact() -> bool:
+        """每个文件的 CRC 都对得上"""
+        try:
+            with ZipFile(FILE_REPOSITORY_ZIP) as zfp:
+                return zfp.testzip() is None
+        except (OSError, BadZipFile):
+            return False
+
+    @staticmethod
+    def _conditional_headers(cached: Optional[dict]) -> Dict[str, str]:
+        if not cached:
+            return {}
+        headers = {}
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    @staticmethod
+    def _repository_unchanged(cached: Optional[dict], response: httpx.Response) -> bool:
+        """304，或者服务器不认条件请求但是 ETag / Last-Modified / Content-Length 都和上次一样"""
+        if not cached or not (cached["etag"] or cached["last_modified"]):
+            return False
+        if response.status_code == 304:
+            return True
+        return response.status_code == 200 and (
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            response.headers.get("Content-Length"),
+        ) == (cached["etag"], cached["last_modified"], str(cached["content_length"]))
+
+    async def unzip_latest_repository(self):
+        """
+        解压到本地；游戏目录就是这个压缩包解出来的 (目录里的记号对得上) 时只解改过、删掉的文件，
+        覆写汉化改过的文件修改时间比记号新
+        """
         logger.info("===== 开始解压最新仓库内容 ...")
+        game_dir = DIR_GAME_ROOT_COMMON if self._type == "common" else DIR_GAME_ROOT_DEV
+        marker = game_dir / FILE_REPOSITORY_MARKER_NAME
+        try:
+            with open(FILE_REPOSITORY_META, "r", encoding="utf-8") as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            meta = None
+
         with ZipFile(FILE_REPOSITORY_ZIP) as zfp:
-            zfp.extractall(DIR_GAME_ROOT_COMMON.parent)
+            members = [info for info in zfp.infolist() if not info.is_dir()]
+            if meta is not None and self._load_repository_marker(marker) == meta:
+                since = marker.stat().st_mtime_ns
+                dirty = [info for info in members if self._member_dirty(game_dir.parent / info.filename, info, since)]
+                for info in dirty:
+                    zfp.extract(info, game_dir.parent)
+                logger.info(f"\t- 游戏目录已是这个版本, 重新解压改过的 {len(dirty)} / {len(members)} 个文件")
+            else:
+                shutil.rmtree(game_dir, ignore_errors=True)
+                zfp.extractall(game_dir.parent)
+                logger.info(f"\t- 解压全部 {len(members)} 个文件")
+
+        if meta is not None:
+            with open(marker, "w", encoding="utf-8") as fp:
+                json.dump(meta, fp, ensure_ascii=False, indent=2)
         logger.info("##### 最新仓库内容已解压! \n")
 
-    async def create_dicts(self):
-        """创建字典"""
+    @staticmethod
+    def _load_repository_marker(marker: Path) -> Optional[dict]:
+        try:
+            with open(marker, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _member_dirty(file: Path, info: ZipInfo, since: int) -> bool:
+        """不在了、大小不对，或者记号写下之后改过"""
+        try:
+            stat = file.stat()
+        except OSError:
+            return True
+        return stat.st_size != info.file_size or stat.st_mtime_ns > since
+
+    async def create_dicts(self, workers: int = None):
+        """
+        创建字典
+        :param workers: 提取用的进程数，默认 CPU 核数，<= 1 时在本进程里跑
+        """
         await self._fetch_all_text_files()
         await self._create_all_text_files_dir()
-        await self._process_texts()
+        await self._process_texts(workers)
 
     async def _fetch_all_text_files(self):
         """获取所有文本文件"""
@@ -138,47 +362,118 @@ class ProjectDOL:
             if not target_dir_csv.exists():
                 os.makedirs(target_dir_csv, exist_ok=True)
 
-    async def _process_texts(self):
+    async def _process_texts(self, workers: int = None):
         """处理翻译文本为键值对"""
         logger.info("===== 开始处理翻译文本为键值对 ...")
-        tasks = [
-            self._process_for_gather(idx, file)
-            for idx, file in enumerate(self._game_texts_file_lists)
+        jobs = [
+            job
+            for job in map(self._extract_job, self._game_texts_file_lists)
+            if job is not None
         ]
-        await asyncio.gather(*tasks)
+        passages: Dict[str, dict] = {}
+        file_entries: Dict[str, bytes] = {}
+        file_hits: List[str] = []
+        reused = parsed = 0
+        ExtractCache().close()  # 先建好表，子进程只读
+        async for _, result in self._extract_in_pool(jobs, workers):
+            for level, message in result.logs:
+                logger.log(level, message)
+            passages.update(result.passages)
+            reused += result.reused
+            parsed += result.parsed
+            if result.file_entry is None:
+                file_hits.append(result.file_key)
+            else:
+                file_entries[result.file_key] = result.file_entry
+        PassageCache.save(passages)
+        extract_cache = ExtractCache()
+        extract_cache.update(file_entries, file_hits)
+        extract_cache.close()
+        logger.info(f"\t- 整文件缓存: 命中 {len(file_hits)} 个文件, 重新提取 {len(file_entries)} 个")
+        logger.info(f"\t- 段落缓存: 复用 {reused} 段, 重新解析 {parsed} 段")
         logger.info("##### 翻译文本已处理为键值对 ! \n")
 
-    async def _process_for_gather(self, idx: int, file: Path):
+    def _extract_job(self, file: Path) -> Optional[Tuple[Path, Path, str]]:
+        """(游戏文件, 字典文件, 版本)，不是 twee / js 的是 None"""
         target_file = file.__str__().split("game\\")[1].replace(SUFFIX_JS, "").replace(SUFFIX_TWEE, "")
+        if file.name.endswith(SUFFIX_JS):
+            target_file = f"{target_file}.js"
+        elif not file.name.endswith(SUFFIX_TWEE):
+            return None
+        return file, DIR_RAW_DICTS / self._version / "csv" / "game" / f"{target_file}.csv", self._version
+
+    @classmethod
+    async def _extract_in_pool(cls, jobs: List[Tuple[Path, Path, str]], workers: int = None) -> AsyncIterator[Tuple[Tuple[Path, Path, str], ExtractResult]]:
+        """
+        把文件分给多个进程提取，大文件先交出去，结果按 jobs 原本的顺序逐个吐出来，
+        所以日志和段落缓存的顺序和单进程一样
+        """
+        workers = os.cpu_count() if workers is None else workers
+        if workers <= 1 or len(jobs) <= 1:
+            cache, extract_cache = PassageCache(), ExtractCache()
+            try:
+                for job in jobs:
+                    yield job, cls._extract_file(*job, cache, extract_cache)
+            finally:
+                extract_cache.close()
+            return
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=cls._init_extract_worker) as pool:
+            futures: Dict[int, asyncio.Future] = {}
+            for idx in sorted(range(len(jobs)), key=lambda i: cls._file_size(jobs[i][0]), reverse=True):
+                futures[idx] = loop.run_in_executor(pool, cls._extract_file, *jobs[idx])
+            for idx, job in enumerate(jobs):
+                yield job, await futures.pop(idx)
 
+    @classmethod
+    def _init_extract_worker(cls):
+        cls._worker_passage_cache = PassageCache()
+        cls._worker_extract_cache = ExtractCache()
+
+    @classmethod
+    def _extract_file(cls, file: Path, csv_file: Path, version: str, cache: PassageCache = None, extract_cache: ExtractCache = None) -> ExtractResult:
+        """
+        提取一个文件写成 csv，可能跑在子进程里，所以日志攒起来交给主进程打
+        整文件缓存命中就完全不解析，没命中再按段落缓存解析
+        """
+        cache = cache or cls._worker_passage_cache
+        extract_cache = extract_cache or cls._worker_extract_cache
+        logs = []
         with open(file, "r", encoding="utf-8") as fp:
             lines = fp.readlines()
-        if file.name.endswith(SUFFIX_TWEE):
-            pt = ParseTextTwee(lines, file)
-        elif file.name.endswith(SUFFIX_JS):
-            pt = ParseTextJS(lines, file)
-            target_file = f"{target_file}.js"
+        file_key = extract_cache.file_key(lines, file)
+        file_entry = extract_cache.get(file_key)
+        if file_entry is not None:
+            able_lines = extract_cache.decode(file_entry, len(lines))
+            if file.name.endswith(SUFFIX_TWEE):
+                cache.retain(lines, file)
+            file_entry = None
+        elif file.name.endswith(SUFFIX_TWEE):
+            able_lines = cache.parse(lines, file)  # 没改过的段落不再解析
+            file_entry = extract_cache.encode(able_lines)
         else:
-            return
-        able_lines = pt.parse()
+            able_lines = ParseTextJS(lines, file).parse()
+            file_entry = extract_cache.encode(able_lines)
+        passages, reused, parsed = cache.take()
+        result = ExtractResult(logs, passages, reused, parsed, file_key, file_entry)
 
         if not any(able_lines):
-            logger.warning(f"\t- ***** 文件 {file} 无有效翻译行 !")
-            return
+            logs.append(("WARNING", f"\t- ***** 文件 {file} 无有效翻译行 !"))
+            return result
         try:
             results_lines_csv = [
-                (f"{idx_ + 1}_{'_'.join(self._version[2:].split('.'))}|", _.strip())
+                (f"{idx_ + 1}_{'_'.join(version[2:].split('.'))}|", _.strip())
                 for idx_, _ in enumerate(lines)
                 if able_lines[idx_]
             ]
         except IndexError:
-            logger.error(f"{file}")
+            logs.append(("ERROR", f"{file}"))
             results_lines_csv = None
         if results_lines_csv:
-            with open(DIR_RAW_DICTS / self._version / "csv" / "game" / f"{target_file}.csv", "w", encoding="utf-8-sig", newline="") as fp:
+            with open(csv_file, "w", encoding="utf-8-sig", newline="") as fp:
                 csv.writer(fp).writerows(results_lines_csv)
-        # logger.info(f"\t- ({idx + 1} / {len(self._game_texts_file_lists)}) {target_file} 处理完毕")
-
+        return result
 
     """更新字典"""
     async def update_dicts(self):
@@ -259,8 +554,17 @@ class ProjectDOL:
         # logger.info(f"\t- ({idx + 1} / {full}) {new_file.__str__().split('game')[1]} 更新完毕")
 
     """应用字典"""
-    async def apply_dicts(self, blacklist_dirs: List[str] = None, blacklist_files: List[str] = None):
-        """汉化覆写游戏文件"""
+    async def apply_dicts(self, blacklist_dirs: List[str] = None, blacklist_files: List[str] = None, by_lineno: bool = False, window: int = 64, workers: int = None, incremental: bool = True, dry_run: bool = False, patch_format: str = "diff", patch_file: Path = None):
+        """
+        汉化覆写游戏文件
+        :param by_lineno: 按词条键里记录的行号直接定位，对不上时才在前后 window 行内按内容找
+        :param window: 按行号定位失败时向前后搜索的行数
+        :param workers: 覆写用的进程数，默认 CPU 核数，<= 1 时在本进程里跑
+        :param incremental: 源文件、字典、覆写规则都没变的文件直接跳过或从缓存恢复
+        :param dry_run: 不动游戏文件和缓存，只把要改的地方逐个文件写进 patch_file
+        :param patch_format: "diff" 是 unified diff, "json" 是每行一个改动的 JSON Lines
+        :param patch_file: 默认写到 temp 目录里
+        """
         if not self._version:
             await self.fetch_latest_version()
         DIR_GAME_TEXTS = DIR_GAME_TEXTS_COMMON if self._type == "common" else DIR_GAME_TEXTS_DEV
@@ -276,19 +580,260 @@ class ProjectDOL:
                 else:
                     file_mapping[Path(root).absolute() / file] = DIR_GAME_TEXTS / Path(root).relative_to(DIR_RAW_DICTS / self._version / "csv" / "game") / f"{file.split('.')[0]}.twee"
 
-        tasks = [
-            self._apply_for_gather(csv_file, twee_file, idx, len(file_mapping))
-            for idx, (csv_file, twee_file) in enumerate(file_mapping.items())
+        if patch_format not in {"diff", "json"}:
+            raise ValueError(f"patch_format 只能是 diff 或 json: {patch_format}")
+        apply_cache = DIR_APPLY_CACHE / self._type  # 正式版和开发版的清单、缓存分开，来回切换不会互相覆盖
+        options = ApplyOptions(
+            by_lineno=by_lineno,
+            window=window,
+            cache_dir=apply_cache if incremental else None,
+            rules=self._apply_rules_hash(by_lineno, window),
+            game_dir=DIR_GAME_TEXTS.parent,
+            patch_format=patch_format if dry_run else None,
+        )
+        manifest = self._load_apply_manifest(apply_cache) if incremental else {}
+        jobs = [
+            (csv_file, target_file, manifest.get(target_file.relative_to(DIR_GAME_TEXTS).as_posix()))
+            for csv_file, target_file in file_mapping.items()
         ]
-        await asyncio.gather(*tasks)
+
+        if dry_run:
+            patch_file = patch_file or DIR_TEMP_ROOT / f"apply_dicts.{'patch' if patch_format == 'diff' else 'jsonl'}"
+            os.makedirs(patch_file.parent, exist_ok=True)
+            patch_fp = open(patch_file, "w", encoding="utf-8", newline="\n")
+        else:
+            patch_fp = None
+
+        stats = Counter()
+        try:
+            async for (_, target_file, _), result in self._apply_in_pool(jobs, options, workers):
+                stats += result.stats
+                stats[result.action] += 1
+                for level, message in result.logs:
+                    logger.log(level, message)
+                if patch_fp and result.patch:
+                    patch_fp.write(result.patch)
+                    stats["patched"] += 1
+                if result.entry:
+                    manifest[target_file.relative_to(DIR_GAME_TEXTS).as_posix()] = result.entry
+                elif result.action == "stale":
+                    manifest.pop(target_file.relative_to(DIR_GAME_TEXTS).as_posix(), None)
+        finally:
+            if patch_fp:
+                patch_fp.close()
+        if dry_run:
+            logger.info(f"\t- 试运行, {stats['patched']} 个文件有改动, 已写入 {patch_file}")
+        elif incremental:
+            self._save_apply_manifest(apply_cache, manifest)
+            logger.info(f"\t- 重新覆写 {stats['applied']} 个文件, 从缓存恢复 {stats['restored']} 个, 跳过 {stats['skipped']} 个, 缺原文 {stats['stale']} 个")
+        if by_lineno:
+            logger.info(f"\t- 按行号定位 {stats['exact']} 条, 行号偏移 {stats['drifted']} 条, 找不到 {stats['missing']} 条")
         logger.info("##### 汉化覆写完毕 !\n")
+        return stats
 
-    async def _apply_for_gather(self, csv_file: Path, target_file: Path, idx: int, full: int):
-        """gather 用"""
-        vip_flag = target_file.name == "clothing-sets.twee"
-        with open(target_file, "r", encoding="utf-8") as fp:
-            raw_targets: List[str] = fp.readlines()
+    @classmethod
+    async def _apply_in_pool(cls, jobs: List[Tuple[Path, Path, Optional[dict]]], options: "ApplyOptions", workers: int = None) -> AsyncIterator[Tuple[Tuple[Path, Path, Optional[dict]], "ApplyResult"]]:
+        """
+        把文件分给多个进程覆写，结果按 jobs 原本的顺序逐个吐出来，日志和试运行的 patch 每次顺序都一样
+        同时在跑和跑完没吐出去的最多 workers * 2 个，头一批里大文件先交出去；patch 不会整棵树攒在内存里
+        :param jobs: (字典文件, 游戏文件, 上次的清单条目)
+        """
+        workers = os.cpu_count() if workers is None else workers
+        if workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                yield job, cls._apply_file(*job, options)
+            return
+
+        loop = asyncio.get_running_loop()
+        window = workers * 2
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures: Dict[int, asyncio.Future] = {}
+            for idx in sorted(range(min(window, len(jobs))), key=lambda i: cls._file_size(jobs[i][1]), reverse=True):
+                futures[idx] = loop.run_in_executor(pool, cls._apply_file, *jobs[idx], options)
+            for idx, job in enumerate(jobs):
+                result = await futures.pop(idx)
+                if idx + window < len(jobs):
+                    futures[idx + window] = loop.run_in_executor(pool, cls._apply_file, *jobs[idx + window], options)
+                yield job, result
+
+    @staticmethod
+    def _file_size(file: Path) -> int:
+        """排大小用，不存在的算 0"""
+        try:
+            return file.stat().st_size
+        except OSError:
+            return 0
+
+    @classmethod
+    def _apply_file(cls, csv_file: Path, target_file: Path, entry: Optional[dict], options: "ApplyOptions") -> "ApplyResult":
+        """
+        覆写一个文件，可能跑在子进程里，所以日志攒起来交给主进程打
+        开了增量时按 (源文件 hash, 字典 hash, 规则 hash) 判断要不要重新覆写:
+        盘上的文件是上次的成品就从缓存里取原文，三样都没变就跳过或直接恢复成品 (词条检查照样跑，警告不会因为跳过就没了)；
+        盘上是成品但缓存里的原文没了，就没法覆写 (不能把汉化过的当原文)，清单里去掉这个文件，等重新解压
+        试运行时什么都不写，只返回盘上文件到成品的 patch
+        """
+        current = target_file.read_bytes()
+        current_hash = cls._sha256(current)
+        source = current
+        if options.cache_dir and entry and current_hash == entry["output"]:  # 盘上是上次覆写的成品
+            source = cls._load_blob(options.cache_dir, entry["source"])
+            if source is None:
+                logs = [("WARNING", f"\t!!! {target_file.name} 已经覆写过, 但缓存里找不到原文, 跳过; 请重新解压游戏后再覆写")]
+                return ApplyResult(Counter(), logs, None, "stale")
+        source_hash = current_hash if source is current else entry["source"]
+        csv_hash = cls._sha256(csv_file.read_bytes())
+
+        if options.cache_dir and entry and (entry["source"], entry["csv"], entry["rules"]) == (source_hash, csv_hash, options.rules):
+            if current_hash == entry["output"]:
+                _, logs = cls._read_rows(csv_file, target_file)
+                return ApplyResult(Counter(entry["stats"]), logs, entry, "skipped")
+            output = cls._load_blob(options.cache_dir, entry["output"])
+            if output is not None and options.patch_format:
+                _, logs = cls._read_rows(csv_file, target_file)
+                patch = cls._format_patch(target_file, options, cls._split_lines(current), cls._split_lines(output))
+                return ApplyResult(Counter(entry["stats"]), logs, None, "restored", patch)
+            if output is not None:
+                _, logs = cls._read_rows(csv_file, target_file)
+                target_file.write_bytes(output)
+                return ApplyResult(Counter(entry["stats"]), logs, entry, "restored")
+
+        source_lines = cls._split_lines(source)
+        raw_targets = source_lines.copy()
+        stats, logs = cls._apply_lines(csv_file, target_file, raw_targets, options)
+        if options.patch_format:
+            current_lines = source_lines if source is current else cls._split_lines(current)
+            patch = cls._format_patch(target_file, options, current_lines, raw_targets)
+            return ApplyResult(stats, logs, None, "applied", patch)
+
+        output = "".join(raw_targets).replace("\n", os.linesep).encode("utf-8")
+        target_file.write_bytes(output)
+        if not options.cache_dir:
+            return ApplyResult(stats, logs, None, "applied")
+
+        cls._save_blob(options.cache_dir, source_hash, source)
+        output_hash = cls._save_blob(options.cache_dir, None, output)
+        entry = {"source": source_hash, "csv": csv_hash, "rules": options.rules, "output": output_hash, "stats": dict(stats)}
+        return ApplyResult(stats, logs, entry, "applied")
+
+    @staticmethod
+    def _split_lines(data: bytes) -> List[str]:
+        """和文本模式 readlines() 一样处理换行"""
+        return io.StringIO(data.decode("utf-8"), newline=None).readlines()
+
+    @staticmethod
+    def _format_patch(target_file: Path, options: "ApplyOptions", old_lines: List[str], new_lines: List[str]) -> str:
+        """
+        盘上的行 -> 覆写后的行
+        new_lines 和 old_lines 一样长时逐行对齐比较 (覆写后为空串的行就是删掉的行)，不然交给 difflib
+        """
+        name = target_file.relative_to(options.game_dir).as_posix()
+        if options.patch_format == "json":
+            if len(new_lines) == len(old_lines):
+                edits = (
+                    (idx_, [old], [new] if new else [])
+                    for idx_, (old, new) in enumerate(zip(old_lines, new_lines))
+                    if old != new
+                )
+            else:
+                new_lines = [_ for _ in new_lines if _]
+                edits = (
+                    (i1, old_lines[i1:i2], new_lines[j1:j2])
+                    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes()
+                    if tag != "equal"
+                )
+            return "".join(
+                json.dumps({
+                    "file": name,
+                    "line": idx_ + 1,
+                    "old": [_.rstrip("\n") for _ in old],
+                    "new": [_.rstrip("\n") for _ in new],
+                }, ensure_ascii=False) + "\n"
+                for idx_, old, new in edits
+            )
+
+        if len(new_lines) == len(old_lines):
+            return "".join(ProjectDOL._aligned_unified_diff(name, old_lines, new_lines))
+        return "".join(
+            line if line.endswith("\n") else f"{line}\n\\ No newline at end of file\n"
+            for line in difflib.unified_diff(old_lines, [_ for _ in new_lines if _], f"a/{name}", f"b/{name}")
+        )
 
+    @staticmethod
+    def _aligned_unified_diff(name: str, old_lines: List[str], new_lines: List[str], context: int = 3) -> Iterator[str]:
+        """逐行对齐的 unified diff，不用 difflib 找最长公共子序列，线性时间"""
+        changed = [idx_ for idx_, (old, new) in enumerate(zip(old_lines, new_lines)) if old != new]
+        if not changed:
+            return
+
+        def _line(prefix: str, line: str) -> str:
+            return f"{prefix}{line}" if line.endswith("\n") else f"{prefix}{line}\n\\ No newline at end of file\n"
+
+        yield f"--- a/{name}\n+++ b/{name}\n"
+        hunks: List[List[int]] = [[changed[0], changed[0]]]
+        for idx_ in changed[1:]:
+            if idx_ - hunks[-1][1] <= context * 2:
+                hunks[-1][1] = idx_
+            else:
+                hunks.append([idx_, idx_])
+
+        deleted = 0  # 前面的 hunk 一共删了几行
+        for first, last in hunks:
+            start, end = max(0, first - context), min(len(old_lines), last + context + 1)
+            body = []
+            for idx_ in range(start, end):
+                old, new = old_lines[idx_], new_lines[idx_]
+                if old == new:
+                    body.append(_line(" ", old))
+                    continue
+                body.append(_line("-", old))
+                if new:
+                    body.append(_line("+", new))
+            hunk_deleted = sum(not new_lines[idx_] for idx_ in range(start, end))
+            yield f"@@ -{start + 1},{end - start} +{start + 1 - deleted},{end - start - hunk_deleted} @@\n"
+            yield from body
+            deleted += hunk_deleted
+
+    @classmethod
+    def _apply_lines(cls, csv_file: Path, target_file: Path, raw_targets: List[str], options: "ApplyOptions") -> Tuple[Counter, List[Tuple[str, str]]]:
+        """
+        把字典覆写进 raw_targets
+        :return: (定位统计, [(日志等级, 日志)])
+        """
+        rows, logs = cls._read_rows(csv_file, target_file)
+        stats = Counter()
+        if not rows:
+            return stats, logs
+
+        if options.by_lineno:
+            rows = cls._apply_by_lineno(raw_targets, rows, options.window, stats)
+            if stats["drifted"] or stats["missing"]:
+                logs.append(("WARNING", f"\t!!! {target_file.name}: 行号偏移 {stats['drifted']} 条, 找不到 {stats['missing']} 条"))
+        line_index = cls._build_line_index(raw_targets) if rows else {}
+        remains = Counter(en for _, en, _ in rows)  # 每个英文还剩几条词条没用
+        for _, en, zh in rows:
+            remains[en] -= 1
+            positions = line_index.get(en)
+            if not positions:
+                # logs.append(("WARNING", f"\t!!! 找不到替换的行: {zh} | {csv_file.name}"))
+                continue
+            # 重复的行按顺序一条词条对一行，最后一条词条包揽剩下的所有行
+            targets = [positions.popleft()] if remains[en] else [positions.popleft() for _ in range(len(positions))]
+            for idx_ in targets:
+                raw_targets[idx_] = cls._apply_line(raw_targets[idx_], en, zh)
+
+        cls._rewrite_source(raw_targets)
+        return stats, logs
+
+    @staticmethod
+    def _read_rows(csv_file: Path, target_file: Path) -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, str]]]:
+        """
+        读出要覆写的词条，顺便按 LINT_RULES 检查
+        :return: ([(行号, 英文, 汉化)], [(日志等级, 日志)])
+        """
+        logs: List[Tuple[str, str]] = []
+        vip_flag = target_file.name == "clothing-sets.twee"
+        rows: List[Tuple[str, str, str]] = []
         with open(csv_file, "r", encoding="utf-8") as fp:
             for row in csv.reader(fp):
                 if len(row) < 3 and not vip_flag:  # 没汉化
@@ -298,108 +843,181 @@ class ProjectDOL:
                 if not zh and not vip_flag:  # 没汉化/汉化为空
                     continue
 
-                if self._is_full_comma(zh):
-                    logger.warning(f"\t!!! 可能的全角逗号错误：{en} | {zh} | https://paratranz.cn/projects/4780/strings?text={quote(zh)}")
-                if self._is_lack_angle(zh, en):
-                    logger.warning(f"\t!!! 可能的尖括号数量错误：{en} | {zh} | https://paratranz.cn/projects/4780/strings?text={quote(zh)}")
-                if self._is_different_event(zh, en):
-                    logger.warning(f"\t!!! 可能的错译额外内容：{en} | {zh} | https://paratranz.cn/projects/4780/strings?text={quote(zh)}")
+                for check, description in LINT_RULES.values():
+                    if check(zh, en):
+                        logs.append(("WARNING", f"\t!!! {description}：{en} | {zh} | {Linter.paratranz_link(zh)}"))
+                rows.append((row[0], en, zh))
+        return rows, logs
 
-                for idx_, target_row in enumerate(raw_targets):
-                    if "replace(/[^a-zA-Z 0-9.!()]" in target_row.strip():
-                        raw_targets[idx_] = target_row.replace("replace(/[^a-zA-Z 0-9.!()]", "replace(/[^a-zA-Z\\u4e00-\\u9fa5 0-9.!()]")
-                        continue
-                    if en == target_row.strip():
-                        raw_targets[idx_] = target_row.replace(en, zh)
-                        if "<<print" in target_row and re.findall(r"<<print.*?\.writing>>", zh):
-                            raw_targets[idx_] = raw_targets[idx_].replace("writing>>", "writ_cn>>")
-                        elif "name_cap" not in target_row:
-                            continue
-
-                        if "<<link " in target_row and re.findall(r"<<link.*?\.name_cap>>", zh):
-                            raw_targets[idx_] = raw_targets[idx_].replace("name_cap>>", "cn_name_cap>>")
-                        elif "<<clothingicon" in target_row and re.findall(r"<<clothingicon.*?\.name_cap", zh):
-                            raw_targets[idx_] = raw_targets[idx_].replace("name_cap", "cn_name_cap")
-                        break
-                    elif "<" in target_row:
-                        if "<<link [[" in target_row and re.findall(r"<<link \[\[(Next\||Next\s\||Leave\||Refuse\||Return\|Resume\||Confirm\||Continue\||Stop\|)", target_row):  # 高频词
-                            raw_targets[idx_] = target_row\
-                                .replace("[[Next", "[[继续")\
-                                .replace("[[Leave", "[[离开")\
-                                .replace("[[Refuse", "[[拒绝")\
-                                .replace("[[Return", "[[返回")\
-                                .replace("[[Resume", "[[返回")\
-                                .replace("[[Confirm", "[[确认")\
-                                .replace("[[Continue", "[[继续")\
-                                .replace("[[Stop", "[[停止")
-                        elif "<<print" in target_row and re.findall(r"<<print.*?\.writing>>", target_row):
-                            raw_targets[idx_] = raw_targets[idx_].replace("writing>>", "writ_cn>>")
-                        elif "name_cap" not in target_row:
-                            continue
-
-                        if "<<link " in target_row and re.findall(r"<<link.*?\.name_cap>>", target_row):
-                            raw_targets[idx_] = raw_targets[idx_].replace("name_cap>>", "cn_name_cap>>")
-                        elif "<<clothingicon" in target_row and re.findall(r"<<clothingicon.*?\.name_cap", target_row):
-                            raw_targets[idx_] = raw_targets[idx_].replace("name_cap", "cn_name_cap")
-                    elif target_row.strip() == "].select($_rng)>>":  # 怪东西
-                        raw_targets[idx_] = ""
-                # else:
-                #     logger.warning(f"\t!!! 找不到替换的行: {zh} | {csv_file.relative_to(DIR_RAW_DICTS / self._version / 'csv' / 'game')}")
-        with open(target_file, "w", encoding="utf-8") as fp:
-            fp.writelines(raw_targets)
-        # logger.info(f"\t- ({idx + 1} / {full}) {target_file.__str__().split('game')[1]} 覆写完毕")
+    """ 增量覆写 """
+    @staticmethod
+    def _apply_rules_hash(by_lineno: bool, window: int) -> str:
+        """覆写规则、决定成品的那些代码和选项一起算 hash，变了成品就得重做，改了代码不用手动加 APPLY_RULES_VERSION"""
+        code = "".join(inspect.getsource(_) for _ in (
+            SourceFixup,
+            HighRateLinkMatcher,
+            ProjectDOL._apply_file,
+            ProjectDOL._split_lines,
+            ProjectDOL._apply_lines,
+            ProjectDOL._read_rows,
+            ProjectDOL._apply_by_lineno,
+            ProjectDOL._parse_lineno,
+            ProjectDOL._build_line_index,
+            ProjectDOL._apply_line,
+            ProjectDOL._rewrite_source,
+        ))
+        rules = json.dumps([
+            APPLY_RULES_VERSION,
+            ProjectDOL._sha256(code.encode("utf-8")),
+            HIGH_RATE_LINKS,
+            [
+                (fixup.group, fixup.marker, fixup.replaces, fixup.pattern.pattern if fixup.pattern else None, fixup.subn is not None, fixup.whole_line, fixup.final)
+                for fixup in SOURCE_FIXUPS
+            ],
+            by_lineno,
+            window,
+        ], ensure_ascii=False)
+        return ProjectDOL._sha256(rules.encode("utf-8"))
 
     @staticmethod
-    def _is_full_comma(line: str):
-        """全角逗号"""
-        return line.endswith('"，')
+    def _load_apply_manifest(cache_dir: Path) -> Dict[str, dict]:
+        """游戏文件相对路径: {source, csv, rules, output, stats}"""
+        manifest_file = cache_dir / FILE_APPLY_MANIFEST_NAME
+        if not manifest_file.exists():
+            return {}
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            logger.warning("\t!!! 增量覆写清单损坏，全部重新覆写")
+            return {}
+
+    @classmethod
+    def _save_apply_manifest(cls, cache_dir: Path, manifest: Dict[str, dict]):
+        """存清单，顺便删掉清单里用不到的缓存"""
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest_file = cache_dir / FILE_APPLY_MANIFEST_NAME
+        temp_file = manifest_file.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as fp:
+            json.dump(manifest, fp, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_file, manifest_file)
+
+        used = {entry[_] for entry in manifest.values() for _ in ("source", "output")}
+        blobs_dir = cache_dir / "blobs"
+        if blobs_dir.exists():
+            for blob in blobs_dir.iterdir():
+                if blob.name not in used:
+                    blob.unlink()
 
     @staticmethod
-    def _is_lack_angle(line_zh: str, line_en: str):
-        """<<> 缺一个 >"""
-        if ("<" not in line_en and ">" not in line_en) or ParseTextTwee.is_only_marks(line_en):
-            return False
+    def _sha256(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
 
-        left_angle_single_zh = re.findall(r"[^<>=](<|>)[^<>=]", line_zh)
-        right_angle_single_zh = re.findall(r"[^<>=](<|>)[^<>=]", line_zh)
-        if "<<" not in line_en and ">>" not in line_en:
-            if len(left_angle_single_zh) == len(right_angle_single_zh):
-                return False
-            left_angle_single_en = re.findall(r"[^<>=](<|>)[^<>=]", line_en)
-            right_angle_single_en = re.findall(r"[^<>=](<|>)[^<>=]", line_en)
-            return (
-                len(left_angle_single_en) != len(left_angle_single_zh)
-                or len(right_angle_single_en) != len(right_angle_single_zh)
-            )  # 形如 < > <, 也只有这一种情况
-
-        left_angle_double_zh = re.findall(r"(<<)", line_zh)
-        right_angle_double_zh = re.findall(r"(>>)", line_zh)
-        if len(left_angle_double_zh) == len(right_angle_double_zh):
-            return False
-        left_angle_double_en = re.findall(r"(<<)", line_en)
-        right_angle_double_en = re.findall(r"(>>)", line_en)
-        return (
-            len(left_angle_double_en) != len(left_angle_double_zh)
-            or len(right_angle_double_en) != len(right_angle_double_zh)
-        )  # 形如 << >> <<
+    @staticmethod
+    def _load_blob(cache_dir: Path, digest: str) -> Optional[bytes]:
+        """按 hash 取缓存内容，没有就 None"""
+        try:
+            return (cache_dir / "blobs" / digest).read_bytes()
+        except OSError:
+            return None
+
+    @classmethod
+    def _save_blob(cls, cache_dir: Path, digest: Optional[str], data: bytes) -> str:
+        """按 hash 存缓存内容，已经有了就不写"""
+        digest = digest or cls._sha256(data)
+        blob = cache_dir / "blobs" / digest
+        if not blob.exists():
+            os.makedirs(blob.parent, exist_ok=True)
+            temp_blob = blob.with_name(f"{digest}.{os.getpid()}.tmp")
+            temp_blob.write_bytes(data)
+            os.replace(temp_blob, blob)
+        return digest
+
+    @classmethod
+    def _apply_by_lineno(cls, raw_targets: List[str], rows: List[Tuple[str, str, str]], window: int, stats: Counter) -> List[Tuple[str, str, str]]:
+        """
+        按键里的行号 `{lineno}_{version}|` 直接覆写，对不上就在前后 window 行里找最近的
+        :return: 键里没有行号的词条，交给按内容覆写
+        """
+        no_lineno_rows = []
+        for key, en, zh in rows:
+            if en in WHOLE_LINE_FIXUP_MARKERS:  # 留给 _rewrite_source 整行换掉
+                continue
+            lineno = cls._parse_lineno(key)
+            if lineno is None:
+                no_lineno_rows.append((key, en, zh))
+                continue
+
+            idx_ = lineno - 1
+            if 0 <= idx_ < len(raw_targets) and raw_targets[idx_].strip() == en:
+                raw_targets[idx_] = cls._apply_line(raw_targets[idx_], en, zh)
+                stats["exact"] += 1
+                continue
+
+            for offset in range(1, window + 1):
+                found = next((
+                    near for near in (idx_ - offset, idx_ + offset)
+                    if 0 <= near < len(raw_targets) and raw_targets[near].strip() == en
+                ), None)
+                if found is not None:
+                    raw_targets[found] = cls._apply_line(raw_targets[found], en, zh)
+                    stats["drifted"] += 1
+                    break
+            else:
+                stats["missing"] += 1
+        return no_lineno_rows
 
     @staticmethod
-    def _is_different_event(line_zh: str, line_en: str):
-        """<<link [[TEXT|EVENT]]>> 中 EVENT 打错了"""
-        if "<<link [[" not in line_en or "|" not in line_en or not line_zh:
-            return False
-        event_en = re.findall(r"<<link\s\[\[.*?\|(.*?)\]\]", line_en)
-        if not event_en:
-            return False
-        event_zh = re.findall(r"<<link\s\[\[.*?\|(.*?)\]\]", line_zh)
-        return event_en != event_zh
+    def _parse_lineno(key: str) -> Optional[int]:
+        """`{lineno}_{version}|` 里的行号"""
+        lineno = key.split("_", 1)[0]
+        return int(lineno) if lineno.isdigit() else None
+
+    @staticmethod
+    def _build_line_index(raw_targets: List[str]) -> Dict[str, Deque[int]]:
+        """去掉首尾空白的行: 所在行号，每个文件只建一次"""
+        line_index: Dict[str, Deque[int]] = defaultdict(deque)
+        for idx_, target_row in enumerate(raw_targets):
+            target_row = target_row.strip()
+            if not target_row or "replace(/[^a-zA-Z 0-9.!()]" in target_row or target_row in WHOLE_LINE_FIXUP_MARKERS:
+                continue
+            line_index[target_row].append(idx_)
+        return line_index
+
+    @staticmethod
+    def _apply_line(target_row: str, en: str, zh: str) -> str:
+        """把一行英文换成汉化，源码里要跟着改的东西交给 _rewrite_source"""
+        return target_row.replace(en, zh)
+
+    @staticmethod
+    def _rewrite_source(raw_targets: List[str]):
+        """按 SOURCE_FIXUPS 逐行修正源码，每行只过一遍"""
+        for idx_, target_row in enumerate(raw_targets):
+            if "<" not in target_row and "replace(/" not in target_row and "].select(" not in target_row:
+                continue
+            used_groups = set()
+            for fixup in SOURCE_FIXUPS:
+                if fixup.group in used_groups:
+                    continue
+                fixed_row = fixup.apply(target_row)
+                if fixed_row is None:
+                    continue
+                used_groups.add(fixup.group)
+                target_row = fixed_row
+                if fixup.final:
+                    break
+            raw_targets[idx_] = target_row
 
     """ 删删删 """
-    async def drop_all_dirs(self):
-        """恢复到最初时的样子"""
+    async def drop_all_dirs(self, keep_game: bool = False):
+        """
+        恢复到最初时的样子
+        :param keep_game: 留着游戏目录，解压时只恢复覆写汉化改过的文件
+        """
         logger.warning("===== 开始删库跑路 ...")
         await self._drop_temp()
-        await self._drop_gitgud()
+        if not keep_game:
+            await self._drop_gitgud()
         await self._drop_dict()
         await self._drop_paratranz()
         logger.warning("##### 删库跑路完毕 !\n")
@@ -1,37 +1,392 @@
 from pathlib import Path
 from aiofiles import open as aopen
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import errno
+import json
+import os
+import random
+import time
 import httpx
 
 from .log import logger
 
-async def chunk_split(filesize: int, chunk: int = 2) -> List[List[int]]:
-    """给大文件切片"""
-    step = filesize // chunk
-    arr = range(0, filesize, step)
-    result = [
-        [arr[i], arr[i + 1] - 1]
-        for i in range(len(arr) - 1)
-    ]
-    result[-1][-1] = filesize - 1
-    # logger.info(f"chunks: {result}")
-    return result
-
-
-async def chunk_download(url: str, client: httpx.AsyncClient, start: int, end: int, idx: int, full: int, save_path: Path):
-    """切片下载"""
-    if not save_path.exists():
-        with open(save_path, "wb") as fp:
-            pass
+"""边下边写时每次最多拿多少字节，一个连接同时只占这么一块内存"""
+STREAM_BUFFER = 256 * 1024
+
+
+def _chunk_problem(response: httpx.Response, start: int, end: int) -> Optional[str]:
+    """切片响应头哪里不对，没问题是 None；长度要等读完才知道"""
+    if response.status_code != 206:
+        return f"状态码 {response.status_code}, 不是 206"
+    content_range = response.headers.get("Content-Range", "")
+    if not content_range.startswith(f"bytes {start}-{end}/"):
+        return f"Content-Range 是 {content_range!r}"
+    return None
+
+
+async def _stream_range(url: str, client: httpx.AsyncClient, start: int, end: int, save_path: Path, validator: Optional[str], filesize: int = None) -> Tuple[Optional[str], bool]:
+    """
+    请求 start-end，边下边写进 save_path，返回 (哪里不对, 是不是分段响应)；
+    给了 filesize 时服务器不认 Range 回 200 整包也照样从头写进去
+    写了一半出错的字节留在文件里也没关系，这段不会记成下完
+    """
     headers = {"Range": f"bytes={start}-{end}"}
-    response = await client.get(url, headers=headers, follow_redirects=True, timeout=60)
+    if validator:
+        headers["If-Range"] = validator
+    ranged = True
+    try:
+        async with client.stream("GET", url, headers=headers, follow_redirects=True, timeout=60) as response:
+            if filesize is not None and response.status_code == 200:
+                ranged, offset, expected = False, 0, filesize
+            else:
+                problem = _chunk_problem(response, start, end)
+                if problem is not None:
+                    return problem, ranged
+                offset, expected = start, end - start + 1
+            written = await _write_stream(response, save_path, offset, expected)
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__}: {e}", ranged
+    if written != expected:
+        return f"长度 {written}{'+' if written > expected else ''}, 应为 {expected}", ranged
+    return None, ranged
+
+
+async def _write_stream(response: httpx.Response, save_path: Path, offset: int, expected: int) -> int:
+    """每次 STREAM_BUFFER 字节写到 offset 开始的位置，超过 expected 就不写了，返回收到的字节数"""
+    written = 0
     async with aopen(save_path, "rb+") as fp:
-        await fp.seek(start)
-        await fp.write(response.content)
-        logger.info(f"\t- 切片 {idx + 1} / {full} 已下载")
+        await fp.seek(offset)
+        async for data in response.aiter_bytes(STREAM_BUFFER):
+            written += len(data)
+            if written > expected:
+                break
+            await fp.write(data)
+    return written
+
+
+def _preallocate(save_path: Path, filesize: int, keep: bool):
+    """
+    一次把文件撑到最终大小，之后每片只管往自己的位置写；
+    有 posix_fallocate 的系统顺便把磁盘空间占好，空间不够一开始就报错
+    :param keep: 续传时保留已经下好的内容
+    """
+    with open(save_path, "rb+" if keep else "wb") as fp:
+        fp.truncate(filesize)
+        if hasattr(os, "posix_fallocate") and filesize:
+            try:
+                os.posix_fallocate(fp.fileno(), 0, filesize)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+
+
+def _parts_file(save_path: Path) -> Path:
+    """记录哪些区间下完了，和下载的文件放一起"""
+    return save_path.with_name(f"{save_path.name}.parts")
+
+
+def _load_parts(save_path: Path, url: str, filesize: int, validator: Optional[str]) -> Optional[dict]:
+    """上次没下完的记录，地址、大小、版本都对得上才能接着下"""
+    if not validator or not save_path.exists():
+        return None
+    try:
+        with open(_parts_file(save_path), "r", encoding="utf-8") as fp:
+            parts = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if (parts.get("url"), parts.get("size"), parts.get("validator")) != (url, filesize, validator):
+        return None
+    if not isinstance(parts.get("done"), list):
+        return None
+    return parts
+
+
+def _save_parts(save_path: Path, parts: dict):
+    parts_file = _parts_file(save_path)
+    temp_file = parts_file.with_name(f"{parts_file.name}.tmp")
+    with open(temp_file, "w", encoding="utf-8") as fp:
+        json.dump(parts, fp)
+    os.replace(temp_file, parts_file)
+
+
+def _merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """[start, end] 闭区间排序后把相接的并起来"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _missing_ranges(done: List[List[int]], filesize: int) -> List[List[int]]:
+    missing, pos = [], 0
+    for start, end in _merge_ranges(done):
+        if start > pos:
+            missing.append([pos, start - 1])
+        pos = max(pos, end + 1)
+    if pos < filesize:
+        missing.append([pos, filesize - 1])
+    return missing
+
+
+class ChunkScheduler:
+    """
+    分段下载调度:
+    同时最多 concurrency 个请求 (信号量，只在请求期间占着，退避等待时放开)，
+    干活的协程是它的两倍，有切片在退避时别的切片能顶上；切片大小按测到的单连接速度定，每片大约 target_seconds 秒下完；
+    第一片顺便试探服务器认不认 Range，不认 (回 200 整包) 就直接用这个整包；
+    跑了超过预计两倍时间的切片 (第一片也算) 再补发一次，谁先下完用谁，另一个取消；
+    新切片发完之前只有第一片会补发，别的切片等没有新切片可发时才补发；
+    每下完一片把下完的区间记进 .parts，中断后再跑只下没下完的区间
+    """
+
+    def __init__(self, url: str, client: httpx.AsyncClient, save_path: Path, filesize: int, validator: str = None, concurrency: int = 8, min_chunk: int = 256 * 1024, max_chunk: int = 16 * 1024 * 1024, target_seconds: float = 2.0, retries: int = 5, backoff: float = 1.0):
+        self.url = url
+        self.client = client
+        self.save_path = save_path
+        self.filesize = filesize
+        self.validator = validator
+        self.concurrency = concurrency
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.target_seconds = target_seconds
+        self.retries = retries
+        self.backoff = backoff
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._parts: dict = {}
+        self._pending: List[List[int]] = []  # 还没发出去的区间
+        self._fetching: Dict[Tuple[int, int], List[asyncio.Task]] = {}  # 切片 -> 正在下它的请求，第一个是原请求
+        self._started: Dict[Tuple[int, int], float] = {}  # 切片第一次拿到并发名额的时间
+        self._hedged: Set[Tuple[int, int]] = set()
+        self._rate: Optional[float] = None  # 单连接 字节/秒，指数平均
+        self._failed = False
+        self.downloaded = 0  # 这次下的字节数
+        self.chunk_sizes: List[int] = []
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def chunk_size(self) -> int:
+        """单连接速度 * 目标秒数 (还没测过就先用 1MB)，但不超过剩下的平分给每个连接的量，免得最后只有一两个连接在下"""
+        size = 1024 * 1024 if self._rate is None else int(self._rate * self.target_seconds)
+        remaining = sum(end - start + 1 for start, end in self._pending)
+        size = min(size, -(-remaining // self.concurrency))
+        return max(self.min_chunk, min(self.max_chunk, size))
+
+    async def run(self) -> bool:
+        parts = _load_parts(self.save_path, self.url, self.filesize, self.validator)
+        if parts is None:
+            parts = {"url": self.url, "size": self.filesize, "validator": self.validator, "done": []}
+        else:
+            done = sum(end - start + 1 for start, end in parts["done"])
+            logger.info(f"\t- 接着上次下载, 已有 {done / 1024 / 1024:.1f} / {self.filesize / 1024 / 1024:.1f} MB")
+        try:
+            _preallocate(self.save_path, self.filesize, keep=bool(parts["done"]))
+        except OSError as e:
+            logger.error(f"***** 没法给下载的文件分配 {self.filesize / 1024 / 1024:.1f}MB: {e}")
+            return False
+        self._parts = parts
+        self._pending = _missing_ranges(parts["done"], self.filesize)
+        _save_parts(self.save_path, parts)
+        logger.info(f"\t- 最多 {self.concurrency} 个并发请求, 切片 {self.min_chunk // 1024}KB ~ {self.max_chunk // 1024}KB, 每片目标 {self.target_seconds}s")
+
+        start = time.perf_counter()
+        if self._pending:
+            ranged = await self._probe()
+            if ranged is None:
+                self._failed = True
+            elif ranged:
+                logger.info(f"\t- 服务器支持分段下载, 单连接 {self._rate / 1024 / 1024:.2f}MB/s, 切片定为 {self.chunk_size() // 1024}KB")
+                workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency * 2)]
+                try:
+                    await asyncio.gather(*workers)
+                finally:  # 出错或被取消时别留下还在写文件的请求
+                    await self._cancel(workers + [task for tasks in self._fetching.values() for task in tasks])
+        elapsed = time.perf_counter() - start
+
+        if self._failed:
+            logger.error(f"***** 有切片多次重试仍然失败, 下次运行{'接着下载' if self.validator else '重新下载'}")
+            return False
+        if _missing_ranges(self._parts["done"], self.filesize) or self.save_path.stat().st_size != self.filesize:
+            logger.error(f"***** 下载的文件大小 {self.save_path.stat().st_size} 与预期 {self.filesize} 不符")
+            _parts_file(self.save_path).unlink(missing_ok=True)
+            return False
+        _parts_file(self.save_path).unlink(missing_ok=True)
+        if self.chunk_sizes:
+            logger.info(
+                f"\t- 下载 {self.downloaded / 1024 / 1024:.1f}MB 用时 {elapsed:.1f}s, 平均 {self.downloaded / 1024 / 1024 / max(elapsed, 1e-6):.2f}MB/s, "
+                f"共 {len(self.chunk_sizes)} 片 ({min(self.chunk_sizes) // 1024}KB ~ {max(self.chunk_sizes) // 1024}KB), "
+                f"补发 {self.hedges} 次, 其中 {self.hedge_wins} 次比原请求先下完"
+            )
+        return True
+
+    def _next_piece(self) -> Optional[Tuple[int, int]]:
+        """从还没发出去的区间切一片，剩下的不到半片就一起带上"""
+        if not self._pending:
+            return None
+        start, end = self._pending[0]
+        size = self.chunk_size()
+        if end - start + 1 < size + size // 2:
+            self._pending.pop(0)
+            return start, end
+        self._pending[0][0] = start + size
+        return start, start + size - 1
+
+    def _hedge_after(self, piece: Tuple[int, int]) -> float:
+        """跑了多少秒算太慢: 按单连接速度预计时间的两倍，至少一秒；第一片还没测过速度，就是一秒"""
+        expected = (piece[1] - piece[0] + 1) / self._rate if self._rate else 0.0
+        return max(1.0, 2 * expected)
+
+    def _straggler(self) -> Optional[Tuple[int, int]]:
+        """跑太久还没补发过的切片"""
+        now = time.perf_counter()
+        for piece, started in self._started.items():
+            if piece not in self._hedged and now - started > self._hedge_after(piece):
+                self._hedged.add(piece)
+                return piece
+        return None
+
+    async def _probe(self) -> Optional[bool]:
+        """
+        第一片: True 服务器认 Range，False 不认 (回的整包已经边下边写好了)，None 重试完了也不行
+        跑太久同样补发一次，不然第一片碰上慢连接，所有切片都得跟着等
+        """
+        piece = self._next_piece()
+        original = asyncio.ensure_future(self._attempts(piece, self.filesize))
+        racers, hedged, outcome = [original], False, None
+        try:
+            while racers and outcome is None:
+                timeout = None if hedged else self._hedge_after(piece)
+                done, _ = await asyncio.wait(racers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    logger.info(f"\t- 切片 {piece[0]}-{piece[1]} 太慢, 补发一次")
+                    racers.append(asyncio.ensure_future(self._attempts(piece, self.filesize)))
+                    continue
+                for task in done:
+                    result = self._outcome(task, piece)
+                    if outcome is None and result is not None:
+                        outcome = result
+                        if task is not original:
+                            self.hedge_wins += 1
+                racers = [task for task in racers if task not in done]
+        finally:
+            await self._cancel(racers)
+        if outcome is None:
+            return None
+
+        ranged, elapsed = outcome
+        if not ranged:
+            logger.warning("\t!!! 服务器不支持分段下载, 已改为整个文件一次下载")
+            self._pending = []
+            self._started.pop(piece, None)
+            piece = (0, self.filesize - 1)
+        self._finish(piece, elapsed)
+        return ranged
+
+    async def _attempts(self, piece: Tuple[int, int], filesize: int = None) -> Optional[Tuple[bool, float]]:
+        """
+        一路请求，出错按 backoff * 2^n 秒 (加一点随机，免得几十片一起重试) 退避重试，只在请求期间占着并发名额
+        :param filesize: 第一片才给，服务器回 200 整包也收下
+        :return: (是不是分段响应, 成功那次的秒数)，重试完了还不行是 None
+        """
+        for attempt in range(self.retries):
+            async with self._semaphore:
+                begin = time.perf_counter()
+                self._started.setdefault(piece, begin)
+                problem, ranged = await _stream_range(self.url, self.client, piece[0], piece[1], self.save_path, self.validator, filesize)
+                elapsed = time.perf_counter() - begin
+            if problem is None:
+                return ranged, elapsed
+            logger.warning(f"\t!!! 切片 {piece[0]}-{piece[1]} 第 {attempt + 1} 次下载失败: {problem}")
+            if attempt + 1 < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+        return None
+
+    async def _worker(self):
+        while not self._failed:
+            piece = self._next_piece()
+            if piece is None:
+                piece = self._straggler()
+                if piece is None:
+                    if not self._fetching:
+                        return
+                    await asyncio.sleep(0.05)
+                    continue
+                self.hedges += 1
+                logger.info(f"\t- 切片 {piece[0]}-{piece[1]} 太慢, 补发一次")
+
+            task = asyncio.ensure_future(self._attempts(piece))
+            self._fetching.setdefault(piece, []).append(task)
+            try:
+                await asyncio.wait([task])  # 不直接 await task: 这样取消的是这个协程还是这个请求分得清
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            if task.cancelled():
+                continue  # 补发的另一个请求先下完了
+            outcome = self._outcome(task, piece)
+            tasks = self._fetching.get(piece)
+            if tasks is None:
+                continue  # 和另一个请求同时下完，那边已经记过了
+            if outcome is None:
+                tasks.remove(task)
+                if not tasks:
+                    self._fetching.pop(piece)
+                    self._failed = True
+                continue
+            if task is not tasks[0]:
+                self.hedge_wins += 1
+            for other in tasks:
+                if other is not task:
+                    other.cancel()
+            self._finish(piece, outcome[1])
+
+    @staticmethod
+    def _outcome(task: asyncio.Task, piece: Tuple[int, int]) -> Optional[Tuple[bool, float]]:
+        """下完的请求的结果；抛了别的异常 (比如写文件出错) 也当这一路失败"""
+        try:
+            return task.result()
+        except Exception as e:
+            logger.error(f"***** 切片 {piece[0]}-{piece[1]} 下载出错: {type(e).__name__}: {e}")
+            return None
+
+    @staticmethod
+    async def _cancel(tasks: List[asyncio.Task]):
+        """取消并等它们真的停下"""
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _finish(self, piece: Tuple[int, int], elapsed: float):
+        """记速度、记进 .parts"""
+        size = piece[1] - piece[0] + 1
+        self._fetching.pop(piece, None)
+        self._started.pop(piece, None)
+        self.downloaded += size
+        self.chunk_sizes.append(size)
+        rate = size / max(elapsed, 1e-6)
+        self._rate = rate if self._rate is None else 0.7 * self._rate + 0.3 * rate
+        self._parts["done"] = _merge_ranges(self._parts["done"] + [list(piece)])
+        _save_parts(self.save_path, self._parts)
+        done = sum(end - start + 1 for start, end in self._parts["done"])
+        logger.info(f"\t- 已下载 {done / self.filesize:.0%}, 单连接 {self._rate / 1024 / 1024:.2f}MB/s, 下一片 {self.chunk_size() // 1024}KB")
+
+
+async def download_in_chunks(url: str, client: httpx.AsyncClient, save_path: Path, filesize: int, validator: str = None, concurrency: int = 8, retries: int = 5, backoff: float = 1.0) -> bool:
+    """
+    分段并发下载整个文件，见 ChunkScheduler；
+    最后检查所有区间都下完了、文件大小对得上，才删掉 .parts 返回 True
+    :param validator: ETag / Last-Modified，没有的话不续传 (没法确定服务器上的文件没变)
+    """
+    return await ChunkScheduler(url, client, save_path, filesize, validator, concurrency, retries=retries, backoff=backoff).run()
 
 
 __all__ = [
-    "chunk_split",
-    "chunk_download"
+    "ChunkScheduler",
+    "download_in_chunks"
 ]